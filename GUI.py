@@ -1,4 +1,7 @@
+import queue
+import threading
 import automator
+import player
 import tkinter_tools as tkTools
 from pynput.keyboard import Key
 
@@ -13,6 +16,7 @@ class Root(tkTools.MainWindow):
                          )
         self.frame = None
         self.stop_key = Key.esc
+        self.pause_key = Key.f9
         self.grid_setup()
         self.widgets()
         self.HomeFrame = HomeFrame(self)
@@ -30,6 +34,54 @@ class Root(tkTools.MainWindow):
         self.frame.columnconfigure(0, weight=1)
 
 
+class BackgroundTask:
+    def __init__(self, widget, function, on_message, on_done, poll_interval=50):
+        """
+        Runs function(post) in a worker thread so that the Tk event loop stays responsive\n
+        Messages passed to post() are queued and delivered to on_message(message) on the Tk thread,
+        polled every poll_interval ms with after(); only the latest "progress" message of each poll is delivered\n
+        on_done(result, error) is called on the Tk thread once function returns or raises
+        """
+        self.widget = widget
+        self.function = function
+        self.on_message = on_message
+        self.on_done = on_done
+        self.poll_interval = poll_interval
+        self.messages = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.widget.after(self.poll_interval, self._poll)
+
+    def _run(self):
+        try:
+            result = self.function(self.messages.put)
+        except Exception as e:
+            self.messages.put(("done", None, e))
+        else:
+            self.messages.put(("done", result, None))
+
+    def _poll(self):
+        progress = None
+        done = None
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progress":
+                progress = message
+            elif message[0] == "done":
+                done = message
+            else:
+                self.on_message(message)
+        if progress:
+            self.on_message(progress)
+        if done:
+            self.on_done(done[1], done[2])
+        else:
+            self.widget.after(self.poll_interval, self._poll)
+
+
 # home frame
 class HomeFrame(tkTools.Frame):
     def __init__(self, root):
@@ -38,6 +90,7 @@ class HomeFrame(tkTools.Frame):
         self.log_list = automator.get_automation_logs()
         self.repeat_options = True
         self.repeat_options_frame = RepeatOptionsFrame(self, self.root)
+        self.speed_options_frame = SpeedOptionsFrame(self, self.root)
         self.grid_configure(row=0, column=0, sticky="NSEW")
         self.grid_setup()
         self.widgets()
@@ -57,6 +110,7 @@ class HomeFrame(tkTools.Frame):
 
     def widgets(self):
         def set_log_dropdown_value():
+            selected_log = log_dropdown.get()
             self.log_list = automator.get_automation_logs()
             log_dropdown.configure(values=self.log_list)
             if not self.log_list:
@@ -67,61 +121,123 @@ class HomeFrame(tkTools.Frame):
             else:
                 no_logs_label.grid_remove()
                 log_dropdown.configure(foreground="black")
-                log_dropdown.current(0)
+                if selected_log in self.log_list:
+                    log_dropdown.set(selected_log)
+                else:
+                    log_dropdown.current(0)
+
+        def poll_log_changes():
+            # the watcher thread only queues changes; the dropdown is refreshed on the Tk thread
+            changed = False
+            while True:
+                try:
+                    log_changes.get_nowait()
+                except queue.Empty:
+                    break
+                changed = True
+            if changed:
+                set_log_dropdown_value()
+            self.after(250, poll_log_changes)
+
+        def set_running(running, stop_function=None, active_button=None):
+            state = "disabled" if running else "normal"
+            log_dropdown.configure(state=state)
+            for button, text in ((automate_button, "Play"), (record_button, "Rec.")):
+                if running and button is active_button:
+                    button.configure(text="Stop", command=stop_function, state="normal")
+                else:
+                    button.configure(text=text, command=button_functions[button], state=state)
+            progressbar.configure(mode="determinate")
+            progressbar.set_value(0)
 
         def run_automator_decor(func):
+            def show_progress(message):
+                _, repeat, events_done, event_count = message
+                if event_count:
+                    repeat_num = self.repeat_options_frame.repeat_times
+                    progressbar.set_value(int(100 * (repeat * event_count + events_done) / (repeat_num * event_count)))
+                else:
+                    progressbar.configure(mode="indeterminate")
+                    progressbar.increment_value(1)
+
+            def finish(log, report, error):
+                set_running(False)
+                if error:
+                    log_output_textbox.output('Error while running "{0}": {1}\n'.format(log, error))
+                else:
+                    if report["wait_timeout"]:
+                        log_output_textbox.output('Stopped "{0}": timed out waiting for {1}'.format(log, report["wait_timeout"]))
+                    elif report["failed_check"]:
+                        log_output_textbox.output('Stopped "{0}": check failed for {1}'.format(log, report["failed_check"]))
+                    elif report["stopped"]:
+                        log_output_textbox.output('Stopped "' + log + '"')
+                    else:
+                        log_output_textbox.output('Finished running "' + log + '"')
+                    log_output_textbox.output("Max. delay behind schedule: {0:.1f} ms\n".format(report["max_lateness"] * 1000))
+
             def wrapper():
                 if not self.log_list:
                     log_output_textbox.output("There are no logs to automate.")
-                    log_output_textbox.see("end")
                     return
-                automate_button.configure(state="disabled")
-                record_button.configure(state="disabled")
                 log = log_dropdown.get()
-                log_dropdown.configure(state="disabled")
-                log_output_textbox.output('Starting "' + log + '"...'),
-                log_output_textbox.see("end"),
-                self.root.iconify()
-                func(log)
-                self.root.deiconify()
-                log_output_textbox.output('Finished running "' + log + '"\n')
-                log_output_textbox.see("end"),
-                log_dropdown.configure(state="normal")
-                record_button.configure(state="normal")
-                automate_button.configure(state="normal")
+                control = player.PlaybackControl()
+                set_running(True, control.stop, automate_button)
+                # the window stays up during playback so that its Stop button can be reached
+                log_output_textbox.output('Starting "' + log + '"...')
+                BackgroundTask(self, lambda post: func(log, post, control), show_progress,
+                               lambda report, error: finish(log, report, error))
             return wrapper
 
         @run_automator_decor
-        def run_automator(log):
-            automator.run_automator(log + ".log", repeat_num=self.repeat_options_frame.repeat_times),
+        def run_automator(log, post, control):
+            return automator.run_automator(log + ".log", repeat_num=self.repeat_options_frame.repeat_times,
+                                           stop_key=self.root.stop_key, pause_key=self.root.pause_key,
+                                           speed=self.speed_options_frame.speed,
+                                           max_gap=self.speed_options_frame.max_gap,
+                                           progress=lambda *progress: post(("progress",) + progress),
+                                           control=control)
 
         def run_recorder_decor(func):
-            def wrapper():
-                name = "log"
-                record_button.configure(state="disabled")
-                automate_button.configure(state="disabled")
-                log_output_textbox.output("Recording started.")
-                log_output_textbox.see("end"),
-                self.root.iconify()
-                func(name)
+            def show_message(message):
+                if message[0] == "started":
+                    # the recording can now be stopped from the GUI as well as with the stop key
+                    set_running(True, message[1], record_button)
+                    progressbar.configure(mode="indeterminate")
+                else:
+                    progressbar.increment_value(1)
+
+            def finish(name, summary, error):
                 self.root.deiconify()
+                set_running(False)
+                if error:
+                    log_output_textbox.output("Error while recording: {0}\n".format(error))
+                    return
                 log_output_textbox.output("Recording saved.")
-                log_output_textbox.see("end"),
+                if summary.get("stuck_keys"):
+                    log_output_textbox.output("Warning: keys pressed but never released: " + ", ".join(summary["stuck_keys"]))
+                if summary["dropped"]:
+                    log_output_textbox.output("Warning: {0} events came in too fast to save and are missing".format(
+                        summary["dropped"]))
                 Editor(self.root, self, name)
-                log_dropdown.configure(state="normal")
                 set_log_dropdown_value()
-                automate_button.configure(state="normal")
-                record_button.configure(state="normal")
+
+            def wrapper():
+                name = "log"
+                set_running(True)
+                log_output_textbox.output("Recording started.")
+                self.root.iconify()
+                BackgroundTask(self, lambda post: func(name, post), show_message,
+                               lambda summary, error: finish(name, summary, error))
             return wrapper
 
         @run_recorder_decor
-        def run_recorder(name):
-            automator.start_recording(name),
+        def run_recorder(name, post):
+            return automator.start_recording(name, progress=lambda event_count: post(("progress", event_count)),
+                                             on_start=lambda stop: post(("started", stop)))
 
         def open_log_deletion_window():
             if not self.log_list:
                 log_output_textbox.output("There are no logs to delete.")
-                log_output_textbox.see("end")
                 return
             log_deletion_window = tkTools.SubWindow(self, title="Log deletion", window_size=(360, 180), min_size=(360, 180))
             log_deletion_window.grid_rowconfigure(0, weight=1)
@@ -160,26 +276,34 @@ class HomeFrame(tkTools.Frame):
                        "This tool can be used to automate mouse clicks and key presses.\n"
                        "To do so, start by clicking the button on the top right. Once clicked, the program will "
                        "begin to record your mouse clicks and key presses. Use the ESC key to stop the recording.\n"
-                       "To run a recording, click the button on the top left. The ESC key will stop the playback.\n\n")
+                       "To run a recording, click the button on the top left. The ESC key will stop the playback, "
+                       "and the F9 key will pause or resume it.\n\n")
         log_dropdown = tkTools.Combobox(self, values=self.log_list, font=("Consolas", 10))
         no_logs_label = tkTools.Label(self, display_text="No logs found", text_color="red", text_alignment="left")
         set_log_dropdown_value()
         log_dropdown.grid_configure(row=1, column=1, columnspan=2, sticky="NEW")
         log_deletion_button = tkTools.Button(self, display_text="delete", function_when_clicked=open_log_deletion_window)
         log_deletion_button.grid_configure(row=3, column=2, sticky="E")
-        log_output_textbox = tkTools.Text(self, wrap_on="word", state="disabled", text=welcome_msg)
+        log_output_textbox = tkTools.Console(self, text=welcome_msg)
         log_output_textbox.grid_configure(row=4, column=1, columnspan=2, sticky="NSEW")
-        log_dropdown.bind("<FocusIn>", lambda e: set_log_dropdown_value())
+        progressbar = tkTools.Progressbar(self, orientation="horizontal", length=100)
+        progressbar.set_value(0)
+        progressbar.grid_configure(row=3, column=1, sticky="EW")
+        log_changes = queue.Queue()
+        self.log_watcher = automator.watch_logs(log_changes.put)
+        poll_log_changes()
 
         # more widgets
         automate_button = tkTools.Button(self, display_text="Play", function_when_clicked=run_automator)
         automate_button.grid_configure(row=0, column=1)
         record_button = tkTools.Button(self, display_text="Rec.", function_when_clicked=run_recorder)
         record_button.grid_configure(row=0, column=2, sticky="E")
+        button_functions = {automate_button: run_automator, record_button: run_recorder}
         settings_button = tkTools.Button(self, display_text="Settings")
         settings_button.grid_configure(row=5, column=2, sticky="SE")
         if self.repeat_options:
-            self.repeat_options_frame.grid_configure(row=2, column=1, columnspan=2, sticky="NSEW")
+            self.repeat_options_frame.grid_configure(row=2, column=1, sticky="NSEW")
+            self.speed_options_frame.grid_configure(row=2, column=2, sticky="NE")
 
 
 # Frame with options for repeating automations
@@ -222,6 +346,67 @@ class RepeatOptionsFrame(tkTools.Frame):
         nTimes_label2.pack_configure(side="left")
 
 
+# Frame with options for playback speed
+class SpeedOptionsFrame(tkTools.Frame):
+    def __init__(self, parent, root):
+        super().__init__(parent)
+        self.root = root
+        self.parent = parent
+        self.speed = 1.0
+        self.max_gap = None
+        self.grid_setup()
+        self.widgets()
+
+    def grid_setup(self):
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_remove()
+
+    def widgets(self):
+        def isfloat_callback(value):
+            if value == "" or value == ".":
+                return True
+            try:
+                return float(value) >= 0
+            except ValueError:
+                return False
+
+        def set_speed():
+            if speed_entry.get() in ("", ".") or float(speed_entry.get()) == 0:
+                speed_entry.delete(0, "end")
+                speed_entry.insert(0, "1")
+            self.speed = float(speed_entry.get())
+
+        def set_max_gap():
+            if max_gap_entry.get() in ("", "."):
+                max_gap_entry.delete(0, "end")
+                self.max_gap = None
+            else:
+                self.max_gap = float(max_gap_entry.get())
+
+        isfloat_cmd = self.register(isfloat_callback)
+
+        speed_frame = tkTools.Frame(self)
+        speed_frame.grid_configure(row=0, column=0, sticky="NE")
+        speed_label = tkTools.Label(speed_frame, display_text="Speed x")
+        speed_entry = tkTools.Entry(speed_frame, width=4, validate_on="key", function_for_testing_validation=(isfloat_cmd, "%P"))
+        speed_entry.insert(0, "1")
+        speed_entry.bind("<FocusOut>", lambda e: set_speed())
+        speed_label.pack_configure(side="left")
+        speed_entry.pack_configure(side="left")
+
+        max_gap_frame = tkTools.Frame(self)
+        max_gap_frame.grid_configure(row=1, column=0, sticky="NE")
+        max_gap_label1 = tkTools.Label(max_gap_frame, display_text="Max. pause ")
+        max_gap_label2 = tkTools.Label(max_gap_frame, display_text=" s")
+        max_gap_entry = tkTools.Entry(max_gap_frame, width=4, validate_on="key", function_for_testing_validation=(isfloat_cmd, "%P"))
+        max_gap_entry.bind("<FocusOut>", lambda e: set_max_gap())
+        max_gap_label1.pack_configure(side="left")
+        max_gap_entry.pack_configure(side="left")
+        max_gap_label2.pack_configure(side="left")
+
+
 class Editor(tkTools.SubWindow):
     def __init__(self, root, parent, log):
         super().__init__(parent,
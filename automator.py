@@ -1,314 +1,500 @@
-import logging
 import os.path
-import pyautogui
-import time
+import input_backends
+import log_format
+import player
+import recorder
+import screen_capture
+import screen_match
+import screen_video
+from log_cache import LogCache
+import log_catalog as catalog
+from log_catalog import LogCatalog
+from log_watcher import LogWatcher
 from collections import deque
+from functools import partial
 from pynput.keyboard import Key, HotKey
 from pynput.keyboard import Listener as Key_Listener
-from pynput.keyboard import Controller as Key_Controller
-from pynput.mouse import Button
 from pynput.mouse import Listener as Mouse_Listener
-from pynput.mouse import Controller as Mouse_Controller
 
 log_folder = "automation_logs"
 log_dir = os.path.join(os.path.dirname(__file__), log_folder)
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
-
-
-def start_recording(save_name, stop_recording_key=Key.esc, compress_held_keys=True, raw_file=False, save_raw_file=False, replace_existing=False):
-
-    class util:
-        def __init__(self):
-            """records time in seconds"""
-            self.start_time = time.perf_counter()
-            self.prev_time = self.start_time
-            self.elapsed_time = self.start_time
-            self.timer = self.start_time
-
-        def process_current_time_stamps(self):
-            current_time = time.perf_counter()
-            self.timer = current_time - self.start_time
-            self.elapsed_time = current_time - self.prev_time
-            self.prev_time = current_time
-
-        def get_timer(self):
-            return self.timer
-
-        def get_elapsed_time(self):
-            return self.elapsed_time
-
-        def restart_timer(self):
-            self.start_time = time.perf_counter()
-            self.prev_time = self.start_time
-            self.elapsed_time = self.start_time
-            self.timer = self.start_time
-
-    def log_key(key):
-        # test for the stop_recording key
-        try:
-            if key.char == stop_recording_key:
-                m_listener.stop()
-                k_listener.stop()
-                return
-        except AttributeError:
-            if key == stop_recording_key:
-                m_listener.stop()
-                k_listener.stop()
-                return
-        # log key
-        timer.process_current_time_stamps()
-        try:
-            logger.info("+{0} {1} {2}".format(key.char, timer.get_timer(), timer.get_elapsed_time()))
-        except AttributeError:
-            logger.info("+{0} {1} {2}".format(key, timer.get_timer(), timer.get_elapsed_time()))
-
-    def log_unkey(key):
-        timer.process_current_time_stamps()
-        try:
-            logger.info("-{0} {1} {2}".format(key.char, timer.get_timer(), timer.get_elapsed_time()))
-        except AttributeError:
-            logger.info("-{0} {1} {2}".format(key, timer.get_timer(), timer.get_elapsed_time()))
-
-    def log_click(x, y, button, pressed):
-        timer.process_current_time_stamps()
-        if pressed:
-            logger.info("1{0} {1},{2} {3} {4}".format(button, x, y, timer.get_timer(), timer.get_elapsed_time()))
-        else:
-            logger.info(("0{0} {1},{2} {3} {4}".format(button, x, y, timer.get_timer(), timer.get_elapsed_time())))
-
-    def log_scroll(x, y, dx, dy):
-        timer.process_current_time_stamps()
-        if dy < 0:
-            logger.info("_ {0},{1} {2} {3}".format(x, y, timer.get_timer(), timer.get_elapsed_time()))
-        else:
-            logger.info("^ {0},{1} {2} {3}".format(x, y, timer.get_timer(), timer.get_elapsed_time()))
-        if dx < 0:
-            logger.info("< {0},{1} {2} {3}".format(x, y, timer.get_timer(), timer.get_elapsed_time()))
-        else:
-            logger.info("> {0},{1} {2} {3}".format(x, y, timer.get_timer(), timer.get_elapsed_time()))
+playback_cache = LogCache(os.path.join(log_dir, ".cache"), encode=player.events_to_rows, decode=player.events_from_rows)
+log_catalog = LogCatalog(log_dir, os.path.join(log_dir, ".cache", "catalog.sqlite3"))
+template_dir = os.path.join(log_dir, "templates")
+stream_threshold = 32 * 1024 * 1024
+
+
+def start_recording(save_name, stop_recording_key=Key.esc, compress_held_keys=True, raw_file=False, save_raw_file=False, replace_existing=False,
+                    record_mouse_moves=False, move_min_distance=3, move_min_interval=0.01, move_tolerance=2.0,
+                    progress=None, on_start=None, compression=None, record_screen=False, screen_fps=30, screen_region=None):
+    """
+    Records keyboard and mouse input until stop_recording_key is pressed and returns the post-processing summary
+    (empty for raw-only recordings) with "dropped" set to the number of events lost to a full ring buffer\n
+    compression is None, "gzip", "lzma" or "zstd"; compressed logs are read transparently\n
+    With record_screen, the screen (or screen_region as (x, y, width, height)) is recorded at screen_fps
+    into a screen_video file next to the log, on the same clock as the input events,
+    along with a frame index mapping each event to the nearest frame (see get_event_frame())\n
+    progress(event_count) is called from the writer thread as events are saved;
+    on_start(stop) is called once recording has started, with a function that stops it from any thread
+    """
+    def stop_recording():
+        m_listener.stop()
+        k_listener.stop()
 
     # prepare file name
     save_name = os.path.splitext(save_name)[0]
-    file_name = os.path.join(log_folder, save_name + ".log")
-    if not replace_existing:
-        file_name = account_for_duplicate_filenames(file_name)
-    if is_duplicate(file_name):
-        file_name = file_name[:-8] + "_RAW" + file_name[-8:]
+    if replace_existing:
+        file_name = os.path.join(log_dir, save_name + ".log")
     else:
-        file_name = file_name[:-4] + "_RAW" + file_name[-4:]
+        # reserve the files the recording writes, so that a raw-only recording does not list an empty log
+        if raw_file:
+            variants = ("raw",)
+        elif save_raw_file:
+            variants = ("processed", "raw")
+        else:
+            variants = ("processed",)
+        file_name = log_catalog.allocate(save_name, variants=variants)
+    name, file_ext = os.path.splitext(file_name)
+    raw_file_name = os.path.join(log_dir, catalog.get_raw_name(os.path.basename(name)) + file_ext)
+    reserved = [] if replace_existing else [{"processed": file_name, "raw": raw_file_name}[variant] for variant in variants]
 
     # start recording
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.INFO)
-
-    recording_format = logging.Formatter("%(message)s")
-    handler = logging.FileHandler(filename=file_name)
-    handler.setFormatter(recording_format)
-    logger.addHandler(handler)
-
-    with (Key_Listener(on_press=log_key, on_release=log_unkey) as k_listener,
-          Mouse_Listener(on_click=log_click, on_scroll=log_scroll) as m_listener):
-        timer = util()
+    event_times = [] if record_screen else None
+    capture = video = None
+    with log_catalog.updating():
+        try:
+            if record_screen:
+                capture = screen_capture.XShmCapture(screen_region)
+                video = screen_video.VideoWriter(name + screen_video.video_extension, capture.width, capture.height)
+                # a failed capture ends the recording instead of silently leaving it without video
+                screen_recorder = screen_capture.ScreenRecorder(capture, screen_fps, on_frame=video.write,
+                                                                on_error=lambda error: stop_recording())
+            if raw_file:
+                writer = recorder.RecordingWriter(raw_file_name=raw_file_name, progress=progress, compression=compression,
+                                                  event_times=event_times)
+            else:
+                writer = recorder.RecordingWriter(file_name, raw_file_name if save_raw_file else None, compress_held_keys,
+                                                  move_tolerance=move_tolerance if record_mouse_moves else None,
+                                                  progress=progress, compression=compression, event_times=event_times)
+        except BaseException:
+            # nothing has been recorded yet, so release the screen and the reserved files
+            if video:
+                video.close()
+                os.remove(name + screen_video.video_extension)
+            if capture:
+                capture.close()
+            for path in reserved:
+                log_catalog.release(path)
+            raise
+        for path in (file_name, raw_file_name):
+            log_catalog.add(path)
+    keyboard_callbacks, mouse_callbacks, flush_moves = recorder.make_callbacks(writer.push, stop_recording, stop_recording_key,
+                                                                                 record_mouse_moves, move_min_distance, move_min_interval)
+    writer.start()
+    with (Key_Listener(**keyboard_callbacks) as k_listener,
+          Mouse_Listener(**mouse_callbacks) as m_listener):
+        if record_screen:
+            screen_recorder.start()
+        if on_start:
+            on_start(stop_recording)
         k_listener.join()
         m_listener.join()
-    logger.removeHandler(handler)
-    handler.close()
-
-    if not raw_file:
-        log_post_processing(file_name, save_raw_file, compress_held_keys)
-
-
-def log_post_processing(log, save_raw_file, compress_held_keys=True):
-    # get log as strings
-    with open(log, "r") as f:
-        lines_orig = f.readlines()
-
+    flush_moves()
+    writer.close()
+    if record_screen:
+        screen_recorder.stop()
+        video.close()
+        capture.close()
+        frame_times = [frame_time - writer.start_time for frame_time in video.frame_times]
+        screen_video.write_frame_index(name + screen_video.frame_index_extension, frame_times, event_times)
+    # the writer has already counted what the catalog would otherwise read the logs again for
+    statistics = {}
+    if writer.processor:
+        statistics[file_name] = (writer.processor.event_count, log_format.ns_to_seconds(writer.processor.prev_time))
+    if writer.raw_file:
+        statistics[raw_file_name] = (writer.raw_event_count, log_format.ns_to_seconds(writer.prev_timer))
+    for path in (file_name, raw_file_name):
+        log_catalog.add(path, *statistics.get(path, ()))
+    if record_screen and screen_recorder.error:
+        raise OSError("Screen recording failed, the input was saved: {0}".format(screen_recorder.error)) from screen_recorder.error
+    summary = writer.processor.get_summary() if writer.processor else {}
+    summary["dropped"] = writer.dropped
+    return summary
+
+
+def log_post_processing(log, save_raw_file, compress_held_keys=True, move_tolerance=None, compression=None):
+    """
+    Post-processes a raw log recorded with raw_file=True, streaming it line by line\n
+    The raw log may be compressed; the processed log is written with compression\n
+    Returns the LogPostProcessor summary
+    """
     # strip "_RAW" from file name
-    if is_duplicate(log):
-        file_name = log[:-12] + log[-8:]
+    name, file_ext = os.path.splitext(log)
+    file_name = os.path.join(os.path.dirname(name), catalog.get_processed_name(os.path.basename(name)) + file_ext)
+    # a frame index recorded alongside the raw log maps raw events, so it is rebuilt for the processed ones
+    frame_index = os.path.splitext(file_name)[0] + screen_video.frame_index_extension
+    event_times = [] if os.path.exists(frame_index) else None
+
+    with log_catalog.updating():
+        with log_format.open_log(log, "r") as raw, log_format.open_log(file_name, "w", compression) as f:
+            processor = recorder.LogPostProcessor(f.write, compress_held_keys, move_tolerance, event_times=event_times)
+            timer_ns = 0
+            for line in raw:
+                if not line.rstrip("\r\n"):
+                    continue
+                record = log_format.parse_text_line(line)[0]
+                timer_ns += record.elapsed_ns
+                processor.add(record.token, record.x, record.y, timer_ns)
+            processor.finish()
+        log_catalog.add(file_name, processor.event_count, log_format.ns_to_seconds(processor.prev_time))
+        if event_times is not None:
+            screen_video.write_frame_index(frame_index, screen_video.read_frame_index(frame_index)[0], event_times)
+
+        # remove RAW file unless it should be kept
+        if not save_raw_file:
+            os.remove(log)
+            log_catalog.remove(log)
+    return processor.get_summary()
+
+
+def compile_log(log, time_precision=10, use_cache=False):
+    """
+    Parses a log once into a list of player.PlaybackEvents\n
+    With use_cache, unchanged logs are loaded from playback_cache instead of being parsed again
+    """
+    log = find_log_file(log, log_dir)
+    if use_cache:
+        return playback_cache.get(log, partial(player.parse_log_file, time_precision=time_precision),
+                                  variant="time_precision={0}".format(time_precision))
+    return player.parse_log_file(log, time_precision)
+
+
+def run_automator(log, repeat_num=1, time_precision=10, stop_key=Key.esc, pause_key=None, spin_threshold=0.002, use_cache=True,
+                  speed=1.0, max_gap=None, gap_replacement=None, backend="pynput", stream=None, progress=None, control=None):
+    """
+    Plays a log repeat_num times and returns the player's report\n
+    backend is an input_backends.InputBackend or the name of one\n
+    With stream, the log is read lazily on every repeat instead of being loaded into memory;
+    by default, compressed logs and logs larger than stream_threshold bytes are streamed,
+    so playback starts without decoding the whole file; streamed logs do not use playback_cache\n
+    progress(repeat, events_done, event_count) is called from the playback thread, with event_count None if unknown\n
+    control is an optional player.PlaybackControl for stopping or pausing playback from another thread\n
+    Wait and check events are evaluated against the screen, with templates from template_dir;
+    if a wait times out or a check fails, playback ends with the report's "wait_timeout" or "failed_check" set to its target
+    """
+    def playback_hotkeys(key):
+        if key == stop_key:
+            control.stop()
+            return False
+        if pause_key is not None and key == pause_key:
+            control.toggle_pause()
+
+    owns_backend = not isinstance(backend, input_backends.InputBackend)
+    backend = input_backends.get_backend(backend)
+    screen = screen_match.ScreenWaits(template_dir)
+    log_stream = None
+    log_path = find_log_file(log, log_dir)
+    if stream is None:
+        # the size on disk says little about a compressed log, which can expand many times over
+        stream = os.path.getsize(log_path) > stream_threshold or log_format.detect_compression(log_path) is not None
+    if stream:
+        log_stream = log_format.LogStream(log_path)
+        program = player.stream_program(log_stream, backend, time_precision, speed, max_gap, gap_replacement, screen)
     else:
-        file_name = log[:-8] + ".log"
-
-    # overwrite RAW file if True
-    if not save_raw_file:
-        os.rename(log, file_name)
-
-    # start post-processing
-    with open(file_name, "w") as f:
-        held_keys = []
-        prev_time = 0.0
-        for line in lines_orig:
-            data = list(line.split(" "))
-            if compress_held_keys:
-                # account for held keys
-                if data[0][0] == "+":
-                    key = data[0][1:]
-                    if key in held_keys:
-                        # if key is already pressed, do not write to logger
-                        continue
-                    held_keys.append(key)
-                if data[0][0] == "-":
-                    key = data[0][1:]
-                    for i, held_key in enumerate(held_keys):
-                        if key == held_key:
-                            # if key is being released, update held_keys
-                            held_keys.pop(i)
-                            break
-                # calculate elapsed time
-                current_time = float(data[-2])
-                data[-1] = str(current_time - prev_time)
-                prev_time = current_time
-            data.pop(-2)
-            f.write(" ".join(data) + "\n")
-
-
-def run_automator(log, repeat_num=1, time_precision=10, stop_key=Key.esc):
-    class IntVar:
-        def __init__(self, value: int = None): self.value = value
-        def set(self, value: int): self.value = value
-        def get(self): return self.value
-        def increment(self, increment=1): self.value += increment
-
-    def stop_automation(key):
-        try:
-            if key == stop_key:
-                key_listener.stop()
-                script_copy.clear()
-                run_num.set(repeat_num)
-        except AttributeError:
-            if key == stop_key:
-                key_listener.stop()
-                script_copy.clear()
-                run_num.value = repeat_num
-
-    # convert log file to strings
-    script = log_to_string(log, time_precision=time_precision)
-
-    keyboard = Key_Controller()
-    mouse = Mouse_Controller()
-    key_listener = Key_Listener(on_press=stop_automation)
+        # parse and bind the log once, outside the playback loop
+        events = compile_log(log, time_precision=time_precision, use_cache=use_cache)
+        if speed != 1.0 or max_gap is not None:
+            events = player.retime_events(events, speed, max_gap, gap_replacement)
+        program = player.bind_events(events, backend, screen)
+
+    def report_progress(repeat, events_done):
+        progress(repeat, events_done, event_count)
+
+    if log_stream is None:
+        event_count = len(program)
+    elif log_stream.event_count is not None:
+        event_count = log_stream.event_count
+    else:
+        # text logs do not store their length, but the catalog may know it without reading the log
+        event_count = log_catalog.get_info(log_path, scan=False)["event_count"]
+    if control is None:
+        control = player.PlaybackControl()
+    key_listener = Key_Listener(on_press=playback_hotkeys)
     key_listener.start()
-
-    # execute script
-    run_num = IntVar(0)
-    while run_num.value < repeat_num:
-        script_copy = script.copy()
-        while len(script_copy) > 0:
-            exec(script_copy.popleft())
-        run_num.increment()
-    script.clear()
+    try:
+        scheduler = player.PlaybackScheduler(spin_threshold=spin_threshold, control=control)
+        return player.play(program, backend, repeat_num, scheduler, report_progress if progress else None)
+    finally:
+        key_listener.stop()
+        screen.close()
+        if log_stream:
+            log_stream.close()
+        if owns_backend:
+            backend.close()
 
 
 def log_to_string(log, time_precision=2):
-    # add file extension if missing
-    file_ext = os.path.splitext(log)[1]
-    if not file_ext:
-        log += ".log"
-    log = os.path.join(log_folder, log)
-
-    with open(log) as f:
-        script_q = deque()
-        f = f.readlines()
-        for line in f:
-            data = list(line.split(" "))
-            script_line = "time.sleep({0})".format(round(float(data[len(data) - 1]), time_precision))
-            script_q.append(script_line)
-            if len(data) > 2:
-                xy = data[1].split(",")
-                script_line = "pyautogui.moveTo({0}, {1}, _pause=False)".format(xy[0], xy[1])
-                script_q.append(script_line)
-            if data[0][0] == "+" and len(data[0]) == 2:
-                script_line = "keyboard.press('{0}')".format(data[0][1:])
-            elif data[0][0] == "+":
-                script_line = "keyboard.press({0})".format(data[0][1:])
-            elif data[0][0] == "-" and len(data[0]) == 2:
-                script_line = "keyboard.release('{0}')".format(data[0][1:])
-            elif data[0][0] == "-":
-                script_line = "keyboard.release({0})".format(data[0][1:])
-            elif data[0][0] == "1":
-                script_line = "mouse.click({0})".format(data[0][1:])
-            elif data[0][0] == "0":
-                script_line = "mouse.release({0})".format(data[0][1:])
-            elif data[0][0] == "^":
-                script_line = "mouse.scroll(0, -1)"
-            elif data[0][0] == "_":
-                script_line = "mouse.scroll(0, 1)"
-            elif data[0][0] == "<":
-                script_line = "mouse.scroll(-1, 0)"
-            elif data[0][0] == ">":
-                script_line = "mouse.scroll(1, 0)"
-            script_q.append(script_line)
-        return script_q
+    """
+    Returns a deque of statements that replay a log in log_dir\n
+    Wait and check events have no statement and are left out; a wait's time is a timeout rather than a pause
+    """
+    statements = {
+        "+": "keyboard.press({0})",
+        "-": "keyboard.release({0})",
+        "1": "mouse.press({0})",
+        "0": "mouse.release({0})",
+        "^": "mouse.scroll(0, -1)",
+        "_": "mouse.scroll(0, 1)",
+        "<": "mouse.scroll(-1, 0)",
+        ">": "mouse.scroll(1, 0)",
+    }
+    script_q = deque()
+    with log_format.LogStream(find_log_file(log)) as records:
+        for record in records:
+            kind, target = record.token[0], record.token[1:]
+            if kind == "w":
+                continue
+            script_q.append("time.sleep({0})".format(round(log_format.ns_to_seconds(record.elapsed_ns), time_precision)))
+            if record.x is not None:
+                script_q.append("pyautogui.moveTo({0}, {1}, _pause=False)".format(record.x, record.y))
+            if kind in statements:
+                script_q.append(statements[kind].format("'{0}'".format(target) if len(target) == 1 else target))
+    return script_q
 
 
 def get_recording(log):
     return log_to_string(log)
 
 
+def add_wait(log, event_number, template, region=None, timeout=None):
+    """
+    Inserts a wait event before event event_number (counting from 0) that waits until template,
+    an image in template_dir, appears on the screen or in region (x, y, width, height)\n
+    The wait takes the place of the recorded gap before the event: the gap becomes its timeout unless timeout is given,
+    and the event follows as soon as the template appears
+    """
+    add_condition(log, event_number, screen_match.format_wait_target(template, region), timeout=timeout)
+
+
+def add_condition(log, event_number, target, check=False, timeout=None):
+    """
+    Inserts a wait event, or with check a check event, for a screen_match condition target before event event_number\n
+    Like add_wait(), the event takes the place of the recorded gap before event_number;
+    a check happens where the event was recorded and ends playback if it fails, and timeout only applies to waits\n
+    Targets for the current screen come from pixel_condition() and checksum_condition()
+    """
+    token = ("a" if check else "w") + target
+    log_files = get_log_files(log)
+    if not log_files:
+        raise FileNotFoundError("No log named " + strip_log_extension(log))
+    with log_catalog.updating():
+        for path in log_files:
+            records, is_raw = log_format.read_log(path)
+            if not 0 <= event_number < len(records):
+                raise IndexError("Event {0} is out of range".format(event_number))
+            event = records[event_number]
+            timeout_ns = event.elapsed_ns if timeout is None or check else log_format.seconds_to_ns(timeout)
+            records.insert(event_number, log_format.LogRecord(token, None, None, timeout_ns))
+            event.elapsed_ns = 0
+            log_format.write_log(path, records, is_raw, log_format.detect_compression(path))
+            log_catalog.add(path)
+            playback_cache.invalidate(path)
+
+
+def pixel_condition(points, tolerance=0):
+    """Returns a condition target that is met when the (x, y) screen points have their current colors"""
+    screen = screen_match.ScreenWaits(template_dir)
+    try:
+        return screen.sample_pixel_target(points, tolerance)
+    finally:
+        screen.close()
+
+
+def checksum_condition(region):
+    """Returns a condition target that is met when region (x, y, width, height) has its current contents"""
+    screen = screen_match.ScreenWaits(template_dir)
+    try:
+        return screen.sample_checksum_target(region)
+    finally:
+        screen.close()
+
+
+def save_template(name, region):
+    """Saves region (x, y, width, height) of the screen into template_dir for wait events and returns the template's name"""
+    if not os.path.splitext(name)[1]:
+        name += ".png"
+    os.makedirs(template_dir, exist_ok=True)
+    screen_match.capture_template(os.path.join(template_dir, name), region)
+    return name
+
+
+def get_event_frame(log, event_number):
+    """
+    Returns (frame number, event time - frame time in seconds, frame) for the screen frame nearest to an event
+    of a log recorded with record_screen, seeking the video from the nearest keyframe instead of decoding all of it\n
+    frame is a (height, width, 4) BGRX array
+    """
+    name = os.path.join(log_dir, strip_log_extension(log))
+    events = screen_video.read_frame_index(name + screen_video.frame_index_extension)[1]
+    if not 0 <= event_number < len(events):
+        raise IndexError("Event {0} is out of range".format(event_number))
+    frame_number, offset_ns = events[event_number]
+    with screen_video.VideoReader(name + screen_video.video_extension) as video:
+        frame = video.seek(frame_number)[2].copy()
+    return frame_number, log_format.ns_to_seconds(offset_ns), frame
+
+
 def account_for_duplicate_filenames(file_name):
+    """
+    Returns file_name, or file_name with a "_(n)" suffix one above the highest one in its folder if it exists\n
+    The name is not reserved; new recordings use log_catalog.allocate() instead
+    """
     # add file extension if missing
     file_ext = os.path.splitext(file_name)[1]
     if not file_ext:
         file_name += ".log"
+        file_ext = ".log"
 
     # return if file_name does not exist
     if not os.path.exists(file_name):
         return file_name
-    else:
-        # append for duplicates
-        path_temp = os.path.splitext(file_name)[0]
-        i = 1
-        while True:
-            filename = "{0}_({1}).log".format(path_temp, str(i))
-            if not os.path.exists(filename):
-                return filename
-            i += 1
+    # append one above the highest suffix, found with a single scan of the folder
+    folder, name = os.path.split(os.path.splitext(file_name)[0])
+    highest = 0
+    with os.scandir(folder or ".") as entries:
+        for entry in entries:
+            base, suffix = catalog.split_duplicate_suffix(os.path.splitext(entry.name)[0])
+            if base == name and suffix:
+                highest = max(highest, int(suffix[2:-1]))
+    return os.path.join(folder, "{0}_({1}){2}".format(name, highest + 1, file_ext))
 
 
 def is_duplicate(file_name):
-    file_name = os.path.splitext(file_name)[0]
-    if file_name[-2].isnumeric():
-        return True
-    else:
-        return False
+    return bool(catalog.split_duplicate_suffix(os.path.splitext(file_name)[0])[1])
+
+
+def strip_log_extension(file):
+    name, file_ext = os.path.splitext(file)
+    if file_ext in log_format.log_extensions:
+        return name
+    return file
+
+
+def find_log_file(log, folder=log_dir):
+    """
+    Returns the path of an existing log in any supported format\n
+    An explicit extension is tried first; the text format is assumed if no file exists
+    """
+    file_ext = os.path.splitext(log)[1]
+    name = strip_log_extension(log)
+    extensions = list(log_format.log_extensions)
+    if file_ext in extensions:
+        extensions.remove(file_ext)
+        extensions.insert(0, file_ext)
+    for ext in extensions:
+        path = os.path.join(folder, name + ext)
+        if os.path.exists(path):
+            return path
+    return os.path.join(folder, name + extensions[0])
+
+
+def get_log_files(file, folder=log_dir):
+    """Returns the paths of every existing format of a log"""
+    name = strip_log_extension(file)
+    return [os.path.join(folder, name + ext) for ext in log_format.log_extensions
+            if os.path.exists(os.path.join(folder, name + ext))]
 
 
 def get_automation_logs(include_raws=False):
-    dir_list = os.listdir(log_dir)
-    log_list = [os.path.splitext(log)[0] for log in dir_list]
-    if not include_raws:
-        i = 0
-        while i < len(log_list):
-            log = log_list[i]
-            if log[-4:] == "_RAW":
-                log_list.pop(i)
-                continue
-            elif is_duplicate(log):
-                if log[-8:-4] == "_RAW":
-                    log_list.pop(i)
-                    continue
-            i += 1
-    return log_list
+    return log_catalog.get_logs(include_raws)
+
+
+def watch_logs(callback=None, debounce=0.2):
+    """
+    Starts a LogWatcher on the log folder that keeps log_catalog up to date
+    and passes each debounced batch of changes to callback(changes) from the watcher thread\n
+    Returns the watcher; call its stop() when finished
+    """
+    def apply_changes(changes):
+        log_catalog.apply_changes(changes, complete=watcher.inotify)
+        if callback:
+            callback(changes)
+
+    watcher = LogWatcher(log_dir, apply_changes, debounce)
+    watcher.start()
+    return watcher
 
 
 def delete_log(file, also_delete_raw=True):
-    file = os.path.splitext(file)[0] + ".log"
-    os.remove(os.path.join(log_dir, file))
-    if also_delete_raw:
-        file_raw_path = os.path.join(log_dir, file[:-4] + "_RAW" + file[-4:])
-        if os.path.exists(file_raw_path):
-            os.remove(file_raw_path)
+    file = strip_log_extension(file)
+    log_files = get_log_files(file)
+    if not log_files:
+        raise FileNotFoundError("No log named " + file)
+    with log_catalog.updating():
+        for path in log_files:
+            os.remove(path)
+            log_catalog.remove(path)
+            playback_cache.invalidate(path)
+        if also_delete_raw:
+            for path in get_log_files(catalog.get_raw_name(file)):
+                os.remove(path)
+                log_catalog.remove(path)
+        for extension in screen_video.extensions:
+            path = os.path.join(log_dir, file + extension)
+            if os.path.exists(path):
+                os.remove(path)
 
 
 def rename_log(file, new_name, also_rename_raw=True):
-    file = os.path.splitext(file)[0] + ".log"
-    new_name = os.path.splitext(new_name)[0]
+    file = strip_log_extension(file)
+    new_name = strip_log_extension(new_name)
     if not new_name:
         new_name = "New_log"
-    new_name += ".log"
-    os.rename(os.path.join(log_dir, file), os.path.join(log_dir, new_name))
-    if also_rename_raw:
-        file_raw_path = os.path.join(log_dir, file[:-4] + "_RAW" + file[-4:])
-        if os.path.exists(file_raw_path):
-            os.rename(file_raw_path, os.path.join(log_dir, new_name[:-4] + "_RAW" + new_name[-4:]))
+    log_files = get_log_files(file)
+    if not log_files:
+        raise FileNotFoundError("No log named " + file)
+    with log_catalog.updating():
+        for path in log_files:
+            new_path = os.path.join(log_dir, new_name + os.path.splitext(path)[1])
+            os.rename(path, new_path)
+            log_catalog.rename(path, new_path)
+            playback_cache.invalidate(path)
+        if also_rename_raw:
+            for path in get_log_files(catalog.get_raw_name(file)):
+                new_path = os.path.join(log_dir, catalog.get_raw_name(new_name) + os.path.splitext(path)[1])
+                os.rename(path, new_path)
+                log_catalog.rename(path, new_path)
+        for extension in screen_video.extensions:
+            path = os.path.join(log_dir, file + extension)
+            if os.path.exists(path):
+                os.rename(path, os.path.join(log_dir, new_name + extension))
+
+
+def compress_log(file, compression="gzip"):
+    """Compresses every format of a log in place, or decompresses it if compression is None"""
+    log_files = get_log_files(file)
+    if not log_files:
+        raise FileNotFoundError("No log named " + strip_log_extension(file))
+    with log_catalog.updating():
+        for path in log_files:
+            log_format.compress_log(path, compression)
+            log_catalog.add(path)
+            playback_cache.invalidate(path)
+
+
+def convert_log(file, to_binary=True, keep_original=False):
+    """Converts a log between the text and binary formats and returns the new file's path"""
+    with log_catalog.updating():
+        if to_binary:
+            path = os.path.join(log_dir, strip_log_extension(file) + log_format.text_extension)
+            new_path = log_format.text_to_binary(path)
+        else:
+            path = os.path.join(log_dir, strip_log_extension(file) + log_format.binary_extension)
+            new_path = log_format.binary_to_text(path)
+        log_catalog.add(new_path)
+        if not keep_original:
+            os.remove(path)
+            log_catalog.remove(path)
+    return new_path
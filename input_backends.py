@@ -0,0 +1,347 @@
+import ctypes
+import ctypes.util
+import time
+from functools import partial
+
+
+def split_key_name(name):
+    """
+    Splits a logged key name into ("char", character), ("key", special key name) or ("vk", virtual key code)\n
+    e.g. "a" -> ("char", "a"), "Key.shift" -> ("key", "shift"), "<65437>" -> ("vk", 65437)
+    """
+    if len(name) == 1:
+        return "char", name
+    if name.startswith("Key."):
+        return "key", name[4:]
+    if name.startswith("<") and name.endswith(">"):
+        return "vk", int(name[1:-1])
+    raise ValueError("Unrecognized key: " + name)
+
+
+def split_button_name(name):
+    """Strips the "Button." prefix from a logged button name"""
+    if name.startswith("Button."):
+        return name[7:]
+    raise ValueError("Unrecognized button: " + name)
+
+
+class InputBackend:
+    """
+    Injects the input events of a log\n
+    Keys and buttons are given as logged (e.g. "Key.shift", "Button.left") to resolve_key() and resolve_button(),
+    and their return values are passed to the other methods
+    """
+    name = None
+
+    def resolve_key(self, name):
+        return name
+
+    def resolve_button(self, name):
+        return name
+
+    def press(self, key):
+        raise NotImplementedError
+
+    def release(self, key):
+        raise NotImplementedError
+
+    def click(self, button):
+        raise NotImplementedError
+
+    def press_button(self, button):
+        raise NotImplementedError
+
+    def release_button(self, button):
+        raise NotImplementedError
+
+    def scroll(self, dx, dy):
+        raise NotImplementedError
+
+    def move_to(self, x, y):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PynputBackend(InputBackend):
+    name = "pynput"
+
+    def __init__(self):
+        """Injects keys, clicks and scrolls with pynput and moves the mouse with pyautogui.moveTo, which keeps its fail-safe"""
+        import pyautogui
+        from pynput.keyboard import Controller as Key_Controller
+        from pynput.keyboard import Key, KeyCode
+        from pynput.mouse import Controller as Mouse_Controller
+        from pynput.mouse import Button
+        self.Key = Key
+        self.KeyCode = KeyCode
+        self.Button = Button
+        self.keyboard = Key_Controller()
+        self.mouse = Mouse_Controller()
+        # bind the controller methods directly to skip a call layer during playback
+        self.press = self.keyboard.press
+        self.release = self.keyboard.release
+        self.click = self.mouse.click
+        self.press_button = self.mouse.press
+        self.release_button = self.mouse.release
+        self.scroll = self.mouse.scroll
+        self.move_to = partial(pyautogui.moveTo, _pause=False)
+
+    def resolve_key(self, name):
+        kind, value = split_key_name(name)
+        if kind == "char":
+            return value
+        if kind == "key":
+            return self.Key[value]
+        return self.KeyCode.from_vk(value)
+
+    def resolve_button(self, name):
+        return self.Button[split_button_name(name)]
+
+
+pyautogui_key_names = {
+    "alt_gr": "altright",
+    "alt_l": "altleft",
+    "alt_r": "altright",
+    "caps_lock": "capslock",
+    "cmd": "win",
+    "cmd_l": "winleft",
+    "cmd_r": "winright",
+    "ctrl_l": "ctrlleft",
+    "ctrl_r": "ctrlright",
+    "media_next": "nexttrack",
+    "media_play_pause": "playpause",
+    "media_previous": "prevtrack",
+    "media_volume_down": "volumedown",
+    "media_volume_mute": "volumemute",
+    "media_volume_up": "volumeup",
+    "menu": "apps",
+    "num_lock": "numlock",
+    "page_down": "pagedown",
+    "page_up": "pageup",
+    "print_screen": "printscreen",
+    "scroll_lock": "scrolllock",
+    "shift_l": "shiftleft",
+    "shift_r": "shiftright",
+}
+
+
+class PyautoguiBackend(InputBackend):
+    name = "pyautogui"
+
+    def __init__(self):
+        import pyautogui
+        self.pyautogui = pyautogui
+        self.press = partial(pyautogui.keyDown, _pause=False)
+        self.release = partial(pyautogui.keyUp, _pause=False)
+        self.move_to = partial(pyautogui.moveTo, _pause=False)
+
+    def resolve_key(self, name):
+        kind, value = split_key_name(name)
+        if kind == "vk":
+            raise ValueError("pyautogui cannot press virtual key codes: " + name)
+        if kind == "key":
+            value = pyautogui_key_names.get(value, value)
+        if not self.pyautogui.isValidKey(value):
+            raise ValueError("pyautogui has no key for " + name)
+        return value
+
+    def resolve_button(self, name):
+        return split_button_name(name)
+
+    def click(self, button):
+        self.pyautogui.click(button=button, _pause=False)
+
+    def press_button(self, button):
+        self.pyautogui.mouseDown(button=button, _pause=False)
+
+    def release_button(self, button):
+        self.pyautogui.mouseUp(button=button, _pause=False)
+
+    def scroll(self, dx, dy):
+        if dy:
+            self.pyautogui.scroll(dy, _pause=False)
+        if dx:
+            self.pyautogui.hscroll(dx, _pause=False)
+
+
+x11_key_names = {
+    "alt": "Alt_L",
+    "alt_gr": "ISO_Level3_Shift",
+    "alt_l": "Alt_L",
+    "alt_r": "Alt_R",
+    "backspace": "BackSpace",
+    "caps_lock": "Caps_Lock",
+    "cmd": "Super_L",
+    "cmd_l": "Super_L",
+    "cmd_r": "Super_R",
+    "ctrl": "Control_L",
+    "ctrl_l": "Control_L",
+    "ctrl_r": "Control_R",
+    "delete": "Delete",
+    "down": "Down",
+    "end": "End",
+    "enter": "Return",
+    "esc": "Escape",
+    "home": "Home",
+    "insert": "Insert",
+    "left": "Left",
+    "media_next": "XF86AudioNext",
+    "media_play_pause": "XF86AudioPlay",
+    "media_previous": "XF86AudioPrev",
+    "media_volume_down": "XF86AudioLowerVolume",
+    "media_volume_mute": "XF86AudioMute",
+    "media_volume_up": "XF86AudioRaiseVolume",
+    "menu": "Menu",
+    "num_lock": "Num_Lock",
+    "page_down": "Next",
+    "page_up": "Prior",
+    "pause": "Pause",
+    "print_screen": "Print",
+    "right": "Right",
+    "scroll_lock": "Scroll_Lock",
+    "shift": "Shift_L",
+    "shift_l": "Shift_L",
+    "shift_r": "Shift_R",
+    "space": "space",
+    "tab": "Tab",
+    "up": "Up",
+}
+x11_buttons = {"left": 1, "middle": 2, "right": 3}
+
+
+class XTestBackend(InputBackend):
+    name = "xtest"
+
+    def __init__(self, display_name=None):
+        """Injects input directly through the X11 XTest extension; requires libX11 and libXtst"""
+        xlib_path = ctypes.util.find_library("X11")
+        xtst_path = ctypes.util.find_library("Xtst")
+        if not xlib_path or not xtst_path:
+            raise OSError("The XTest backend requires libX11 and libXtst")
+        self.xlib = ctypes.cdll.LoadLibrary(xlib_path)
+        self.xtst = ctypes.cdll.LoadLibrary(xtst_path)
+        self.xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.xlib.XOpenDisplay.restype = ctypes.c_void_p
+        self.xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self.xlib.XFlush.argtypes = [ctypes.c_void_p]
+        self.xlib.XStringToKeysym.argtypes = [ctypes.c_char_p]
+        self.xlib.XStringToKeysym.restype = ctypes.c_ulong
+        self.xlib.XKeysymToKeycode.argtypes = [ctypes.c_void_p, ctypes.c_ulong]
+        self.xlib.XKeysymToKeycode.restype = ctypes.c_ubyte
+        self.xtst.XTestFakeKeyEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+        self.xtst.XTestFakeButtonEvent.argtypes = [ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_ulong]
+        self.xtst.XTestFakeMotionEvent.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_ulong]
+        self.display = self.xlib.XOpenDisplay(display_name.encode("utf-8") if display_name else None)
+        if not self.display:
+            raise OSError("Cannot open X display {0}".format(display_name or ""))
+        self.flush = partial(self.xlib.XFlush, self.display)
+        self.fake_key = partial(self.xtst.XTestFakeKeyEvent, self.display)
+        self.fake_button = partial(self.xtst.XTestFakeButtonEvent, self.display)
+        self.fake_motion = partial(self.xtst.XTestFakeMotionEvent, self.display, -1)
+
+    def resolve_key(self, name):
+        kind, value = split_key_name(name)
+        if kind == "char":
+            # Latin-1 keysyms equal their code points; other characters use the Unicode keysym range
+            keysym = ord(value) if ord(value) < 0x100 else 0x01000000 + ord(value)
+        elif kind == "key":
+            if value[0] == "f" and value[1:].isdigit():
+                x11_name = "F" + value[1:]
+            else:
+                x11_name = x11_key_names.get(value, value)
+            keysym = self.xlib.XStringToKeysym(x11_name.encode("utf-8"))
+        else:
+            # pynput logs X11 keysyms as virtual key codes
+            keysym = value
+        keycode = self.xlib.XKeysymToKeycode(self.display, keysym) if keysym else 0
+        if not keycode:
+            raise ValueError("No X11 keycode for " + name)
+        return keycode
+
+    def resolve_button(self, name):
+        return x11_buttons[split_button_name(name)]
+
+    def press(self, keycode):
+        self.fake_key(keycode, True, 0)
+        self.flush()
+
+    def release(self, keycode):
+        self.fake_key(keycode, False, 0)
+        self.flush()
+
+    def click(self, button):
+        self.fake_button(button, True, 0)
+        self.fake_button(button, False, 0)
+        self.flush()
+
+    def press_button(self, button):
+        self.fake_button(button, True, 0)
+        self.flush()
+
+    def release_button(self, button):
+        self.fake_button(button, False, 0)
+        self.flush()
+
+    def scroll(self, dx, dy):
+        # X11 scrolls with buttons 4 (up), 5 (down), 6 (left) and 7 (right)
+        for button, steps in ((4 if dy > 0 else 5, abs(dy)), (7 if dx > 0 else 6, abs(dx))):
+            for _ in range(steps):
+                self.fake_button(button, True, 0)
+                self.fake_button(button, False, 0)
+        self.flush()
+
+    def move_to(self, x, y):
+        # logs from platforms that report fractional coordinates keep them
+        self.fake_motion(round(x), round(y), 0)
+        self.flush()
+
+    def close(self):
+        if self.display:
+            self.xlib.XCloseDisplay(self.display)
+            self.display = None
+
+
+class MockBackend(InputBackend):
+    name = "mock"
+
+    def __init__(self):
+        """Records every injected call as (perf_counter_ns, method, args) in calls instead of injecting it"""
+        self.calls = []
+
+    def press(self, key):
+        self.calls.append((time.perf_counter_ns(), "press", (key,)))
+
+    def release(self, key):
+        self.calls.append((time.perf_counter_ns(), "release", (key,)))
+
+    def click(self, button):
+        self.calls.append((time.perf_counter_ns(), "click", (button,)))
+
+    def press_button(self, button):
+        self.calls.append((time.perf_counter_ns(), "press_button", (button,)))
+
+    def release_button(self, button):
+        self.calls.append((time.perf_counter_ns(), "release_button", (button,)))
+
+    def scroll(self, dx, dy):
+        self.calls.append((time.perf_counter_ns(), "scroll", (dx, dy)))
+
+    def move_to(self, x, y):
+        self.calls.append((time.perf_counter_ns(), "move_to", (x, y)))
+
+    def clear(self):
+        self.calls = []
+
+
+backends = {backend.name: backend for backend in (PynputBackend, PyautoguiBackend, XTestBackend, MockBackend)}
+
+
+def get_backend(backend="pynput", **kwargs):
+    """Returns backend if it is already an InputBackend, otherwise creates the backend with that name"""
+    if isinstance(backend, InputBackend):
+        return backend
+    if backend not in backends:
+        raise ValueError("Unknown input backend: {0} (available: {1})".format(backend, ", ".join(backends)))
+    return backends[backend](**kwargs)
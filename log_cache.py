@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import os.path
+import time
+
+
+class LogCache:
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024, max_entries=256, encode=None, decode=None):
+        """
+        On-disk cache of compiled logs, keyed by file path, mtime and content hash\n
+        Entries are evicted least recently used first once max_bytes or max_entries is exceeded\n
+        Use get() with a function that compiles the log on a cache miss\n
+        Entries are stored as JSON, never pickled, so a tampered cache cannot run code;
+        encode(value) and decode(data) convert values to and from JSON-serializable data if given
+        """
+        self.cache_dir = cache_dir
+        self.encode = encode
+        self.decode = decode
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.index = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path, compile_func, variant=""):
+        """
+        Returns the cached value for path, or compile_func(path) if the log changed\n
+        variant distinguishes compilations of the same file with different settings
+        """
+        self._load_index()
+        path = os.path.abspath(path)
+        key = "{0}|{1}".format(path, variant)
+        stat = os.stat(path)
+        entry = self.index.get(key)
+        if entry is not None:
+            if entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+                # the file was touched; only recompile if its contents changed
+                if entry["hash"] != file_hash(path):
+                    entry = None
+                else:
+                    entry["mtime_ns"] = stat.st_mtime_ns
+                    entry["size"] = stat.st_size
+            if entry is not None:
+                value = self._read_entry(entry)
+                if value is not None:
+                    self.hits += 1
+                    entry["last_used"] = time.time()
+                    self._save_index()
+                    return value
+        self.misses += 1
+        value = compile_func(path)
+        self._store(key, path, stat, value)
+        return value
+
+    def invalidate(self, path):
+        self._load_index()
+        path = os.path.abspath(path)
+        for key in [key for key, entry in self.index.items() if entry["path"] == path]:
+            self._remove(key)
+        self._save_index()
+
+    def clear(self):
+        self._load_index()
+        for key in list(self.index):
+            self._remove(key)
+        self._save_index()
+
+    def _store(self, key, path, stat, value):
+        data = json.dumps(self.encode(value) if self.encode else value, separators=(",", ":")).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_file = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest() + ".json"
+        write_atomic(os.path.join(self.cache_dir, entry_file), data)
+        self.index[key] = {
+            "path": path,
+            "file": entry_file,
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "hash": file_hash(path),
+            "bytes": len(data),
+            "last_used": time.time(),
+        }
+        self._evict()
+        self._save_index()
+
+    def _evict(self):
+        total_bytes = sum(entry["bytes"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]["last_used"]):
+            if total_bytes <= self.max_bytes and len(self.index) <= self.max_entries:
+                break
+            total_bytes -= self.index[key]["bytes"]
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.index.pop(key)
+        try:
+            os.remove(os.path.join(self.cache_dir, entry["file"]))
+        except FileNotFoundError:
+            pass
+
+    def _read_entry(self, entry):
+        try:
+            with open(os.path.join(self.cache_dir, entry["file"]), "rb") as f:
+                data = json.load(f)
+            return self.decode(data) if self.decode else data
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def _load_index(self):
+        if self.index is not None:
+            return
+        try:
+            with open(self.index_file, "r") as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+        # entries pickled by earlier versions are dropped without being read
+        for key in [key for key, entry in self.index.items() if not entry["file"].endswith(".json")]:
+            self._remove(key)
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_atomic(self.index_file, json.dumps(self.index).encode("utf-8"))
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def write_atomic(path, data):
+    temp_path = path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
@@ -0,0 +1,313 @@
+import contextlib
+import os
+import os.path
+import re
+import sqlite3
+import threading
+import log_format
+from log_cache import file_hash
+
+raw_name_pattern = re.compile(r"_RAW(_\(\d+\))?$")
+duplicate_suffix_pattern = re.compile(r"_\((\d+)\)$")
+
+schema = """
+CREATE TABLE IF NOT EXISTS logs (
+    file TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    variant TEXT NOT NULL,
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    event_count INTEGER,
+    duration REAL,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS logs_by_variant ON logs (variant, name);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+
+class LogCatalog:
+    def __init__(self, log_dir, db_file):
+        """
+        SQLite index of the logs in log_dir, storing each file's name, raw/processed variant, format,
+        size, event count, duration and content hash\n
+        Call add(), remove() and rename() inside updating() when logs change;
+        the folder is only rescanned when its modification time differs from the last scan\n
+        Event counts, durations and hashes are given to add() by the code that wrote a log,
+        or computed on first use by get_info()
+        """
+        self.log_dir = log_dir
+        self.db_file = db_file
+        self.connection = None
+        self.lock = threading.RLock()
+        self.next_suffix = {}
+
+    def get_logs(self, include_raws=False):
+        """Returns the names of the logs in the folder, without extensions"""
+        with self.lock:
+            self.reconcile()
+            if include_raws:
+                rows = self.connection.execute("SELECT DISTINCT name FROM logs ORDER BY name")
+            else:
+                rows = self.connection.execute("SELECT DISTINCT name FROM logs WHERE variant = 'processed' ORDER BY name")
+            return [name for (name,) in rows]
+
+    def get_info(self, path, scan=True):
+        """
+        Returns the catalog entry for a log file as a dict, or None if it does not exist\n
+        Without scan, an event count, duration and hash that are not known yet are left as None
+        instead of being computed with a pass over the log
+        """
+        with self.lock:
+            self._connect()
+            self.add(path)
+            file = os.path.basename(path)
+            row = self.connection.execute("SELECT file, name, variant, format, size, mtime_ns, event_count, duration, hash "
+                                          "FROM logs WHERE file = ?", (file,)).fetchone()
+            if row is None:
+                return None
+            info = dict(zip(("file", "name", "variant", "format", "size", "mtime_ns", "event_count", "duration", "hash"), row))
+            if info["hash"] is None and scan:
+                info["event_count"], info["duration"] = scan_log(os.path.join(self.log_dir, file))
+                info["hash"] = file_hash(os.path.join(self.log_dir, file))
+                with self.connection:
+                    self.connection.execute("UPDATE logs SET event_count = ?, duration = ?, hash = ? WHERE file = ?",
+                                            (info["event_count"], info["duration"], info["hash"], file))
+            return info
+
+    def add(self, path, event_count=None, duration=None):
+        """
+        Adds or refreshes a log file; its statistics are recomputed if it changed\n
+        A caller that has just written the log can give its event_count and duration in seconds,
+        which are stored with its hash so that get_info() does not have to read the log again
+        """
+        with self.lock:
+            self._connect()
+            file = os.path.basename(path)
+            try:
+                stat = os.stat(os.path.join(self.log_dir, file))
+            except FileNotFoundError:
+                self.remove(path)
+                return
+            row = self.connection.execute("SELECT size, mtime_ns FROM logs WHERE file = ?", (file,)).fetchone()
+            if row != (stat.st_size, stat.st_mtime_ns):
+                with self.connection:
+                    self._store(file, stat)
+            if event_count is not None:
+                with self.connection:
+                    self.connection.execute("UPDATE logs SET event_count = ?, duration = ?, hash = ? WHERE file = ?",
+                                            (event_count, duration, file_hash(os.path.join(self.log_dir, file)), file))
+
+    def remove(self, path):
+        with self.lock:
+            self._connect()
+            with self.connection:
+                self.connection.execute("DELETE FROM logs WHERE file = ?", (os.path.basename(path),))
+
+    def rename(self, path, new_path):
+        """Moves an entry without recomputing its statistics, as renaming does not change the contents"""
+        with self.lock:
+            self._connect()
+            file = os.path.basename(path)
+            new_file = os.path.basename(new_path)
+            if self.connection.execute("SELECT 1 FROM logs WHERE file = ?", (file,)).fetchone() is None:
+                # already renamed, or never catalogued
+                self.add(new_path)
+                return
+            name, variant, file_format = describe(new_file)
+            with self.connection:
+                self.connection.execute("DELETE FROM logs WHERE file = ?", (new_file,))
+                self.connection.execute("UPDATE logs SET file = ?, name = ?, variant = ?, format = ? WHERE file = ?",
+                                        (new_file, name, variant, file_format, file))
+
+    def apply_changes(self, changes, complete=False):
+        """
+        Applies a batch of changes from a log_watcher.LogWatcher\n
+        With complete, the batch is known to cover every change to the folder,
+        so the catalog is marked as up to date and the next listing does not rescan
+        """
+        with self.lock:
+            self._connect()
+            in_sync = complete and self._get_meta("dir_mtime_ns") is not None
+            for kind, file, new_file in changes:
+                if kind == "renamed":
+                    self.rename(file, new_file)
+                elif kind == "removed":
+                    self.remove(file)
+                else:
+                    self.add(file)
+            if in_sync:
+                self._set_meta("dir_mtime_ns", self._get_dir_mtime())
+
+    def allocate(self, name, extension=log_format.text_extension, variants=("processed",)):
+        """
+        Creates the empty log files for a new recording and returns the processed log's path\n
+        The recording is named name, or name_(n) with n one above the highest suffix in use for that name
+        by a processed or raw log; variants lists the files to create, "processed" and/or "raw" (name_RAW_(n))\n
+        The files are created with O_EXCL, so concurrent recorders never receive the same files
+        """
+        with self.lock, self.updating():
+            suffix = self.next_suffix.get(name)
+            if suffix is None:
+                suffix = self._get_highest_suffix(name) + 1
+            while True:
+                recording_name = name if suffix == 0 else "{0}_({1})".format(name, suffix)
+                paths = {"processed": os.path.join(self.log_dir, recording_name + extension),
+                         "raw": os.path.join(self.log_dir, get_raw_name(recording_name) + extension)}
+                created = []
+                try:
+                    for variant in variants:
+                        os.close(os.open(paths[variant], os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666))
+                        created.append(paths[variant])
+                except FileExistsError:
+                    for path in created:
+                        os.remove(path)
+                    suffix += 1
+                    continue
+                break
+            self.next_suffix[name] = suffix + 1
+            for path in created:
+                self.add(path)
+            return paths["processed"]
+
+    def release(self, path):
+        """Deletes a file from allocate() that was never recorded into, so that its name can be allocated again"""
+        with self.lock, self.updating():
+            os.remove(path)
+            self.remove(path)
+            # the cached suffixes are only a shortcut for the lookup, which now finds the freed name
+            self.next_suffix = {}
+
+    @contextlib.contextmanager
+    def updating(self):
+        """
+        Wraps changes to the log folder that are reported to the catalog,
+        so that they do not trigger a rescan unless the folder was already out of date
+        """
+        with self.lock:
+            self._connect()
+            in_sync = self._get_dir_mtime() == self._get_meta("dir_mtime_ns")
+            yield self
+            if in_sync:
+                self._set_meta("dir_mtime_ns", self._get_dir_mtime())
+
+    def reconcile(self, force=False):
+        """Rescans the log folder if it changed since the last scan; returns True if it was rescanned"""
+        with self.lock:
+            self._connect()
+            dir_mtime = self._get_dir_mtime()
+            if not force and dir_mtime == self._get_meta("dir_mtime_ns"):
+                return False
+            known = {file: (size, mtime_ns) for file, size, mtime_ns in
+                     self.connection.execute("SELECT file, size, mtime_ns FROM logs")}
+            with self.connection:
+                with os.scandir(self.log_dir) as entries:
+                    for entry in entries:
+                        if os.path.splitext(entry.name)[1] not in log_format.log_extensions or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                        if known.pop(entry.name, None) != (stat.st_size, stat.st_mtime_ns):
+                            self._store(entry.name, stat)
+                self.connection.executemany("DELETE FROM logs WHERE file = ?", [(file,) for file in known])
+            self._set_meta("dir_mtime_ns", dir_mtime)
+            return True
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    def _get_highest_suffix(self, name):
+        """
+        Returns the highest duplicate suffix in use for name by a processed or raw log,
+        0 if only name itself exists and -1 if neither does
+        """
+        self.reconcile()
+        escaped_name = re.sub(r"([*?\[])", r"[\1]", name)
+        highest = -1
+        rows = self.connection.execute("SELECT DISTINCT name FROM logs WHERE name IN (?, ?) OR name GLOB ? OR name GLOB ?",
+                                       (name, name + "_RAW", escaped_name + "_([0-9]*)", escaped_name + "_RAW_([0-9]*)"))
+        for (existing_name,) in rows:
+            existing_name = get_processed_name(existing_name)
+            if existing_name == name:
+                highest = max(highest, 0)
+                continue
+            match = duplicate_suffix_pattern.search(existing_name)
+            if match and existing_name[:match.start()] == name:
+                highest = max(highest, int(match.group(1)))
+        return highest
+
+    def _store(self, file, stat):
+        name, variant, file_format = describe(file)
+        self.connection.execute("INSERT OR REPLACE INTO logs (file, name, variant, format, size, mtime_ns) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                (file, name, variant, file_format, stat.st_size, stat.st_mtime_ns))
+
+    def _get_dir_mtime(self):
+        return os.stat(self.log_dir).st_mtime_ns
+
+    def _get_meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _connect(self):
+        if self.connection is not None:
+            return
+        os.makedirs(os.path.dirname(self.db_file), exist_ok=True)
+        try:
+            self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.connection.executescript(schema)
+        except sqlite3.DatabaseError:
+            # the catalog can always be rebuilt from the folder
+            if self.connection is not None:
+                self.connection.close()
+            os.remove(self.db_file)
+            self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.connection.executescript(schema)
+
+
+def describe(file):
+    """Returns (name, variant, format) for a log file name"""
+    name, file_ext = os.path.splitext(file)
+    variant = "raw" if raw_name_pattern.search(name) else "processed"
+    file_format = "binary" if file_ext == log_format.binary_extension else "text"
+    return name, variant, file_format
+
+
+def split_duplicate_suffix(name):
+    """Returns (base name, suffix) for a name like "log_(2)", with an empty suffix for names without one"""
+    match = duplicate_suffix_pattern.search(name)
+    if match:
+        return name[:match.start()], name[match.start():]
+    return name, ""
+
+
+def get_raw_name(name):
+    """Returns the raw log name for a processed log name ("log_(2)" -> "log_RAW_(2)")"""
+    base, suffix = split_duplicate_suffix(name)
+    return base + "_RAW" + suffix
+
+
+def get_processed_name(raw_name):
+    """Returns the processed log name for a raw log name ("log_RAW_(2)" -> "log_(2)")"""
+    return raw_name_pattern.sub(lambda match: match.group(1) or "", raw_name)
+
+
+def scan_log(path):
+    """Returns (event count, duration in seconds) with a single streaming pass over a log"""
+    event_count = 0
+    elapsed_ns = 0
+    with log_format.LogStream(path) as records:
+        for record in records:
+            event_count += 1
+            elapsed_ns += record.elapsed_ns
+    return event_count, log_format.ns_to_seconds(elapsed_ns)
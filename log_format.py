@@ -0,0 +1,451 @@
+import gzip
+import lzma
+import os
+import os.path
+import shutil
+import struct
+import time
+
+text_extension = ".log"
+binary_extension = ".alog"
+log_extensions = (text_extension, binary_extension)
+
+BINARY_MAGIC = b"SCTL"
+BINARY_VERSION = 2
+FLAG_RAW = 0x01
+# record flags; the WIDE and FLOAT flags are escapes for values that do not fit the narrow fields
+FLAG_HAS_XY = 0x01
+FLAG_HAS_KEY = 0x02
+FLAG_WIDE_KEY = 0x04
+FLAG_WIDE_XY = 0x08
+FLAG_FLOAT_XY = 0x10
+FLAG_WIDE_TIME = 0x20
+NO_KEY = 0xFFFF
+
+# magic, version, file flags, key table length, event count
+header_struct = struct.Struct("<4sHHII")
+# key table entry length, followed by the utf-8 encoded key name
+key_length_struct = struct.Struct("<H")
+# kind and record flags, followed by the fields the flags call for, in this order:
+# key table index, x and y deltas from the previous event with coordinates (or absolute fractional coordinates),
+# elapsed nanoseconds
+record_head_struct = struct.Struct("<BB")
+key_struct = struct.Struct("<B")
+wide_key_struct = struct.Struct("<H")
+xy_struct = struct.Struct("<hh")
+wide_xy_struct = struct.Struct("<ii")
+float_xy_struct = struct.Struct("<dd")
+time_struct = struct.Struct("<I")
+wide_time_struct = struct.Struct("<q")
+# version 1 records: kind, record flags, key table index, x delta, y delta, elapsed nanoseconds
+# the longest a record can be, with every field at its widest
+max_record_size = record_head_struct.size + wide_key_struct.size + float_xy_struct.size + wide_time_struct.size
+v1_record_struct = struct.Struct("<BBHiiq")
+
+# the monotonic clock that recorded input events and screen frames are timestamped with, so the two line up
+clock_ns = time.perf_counter_ns
+
+# compressed logs keep their extension and are recognized by the magic bytes of the compressed stream
+compression_magic = {
+    "gzip": b"\x1f\x8b",
+    "lzma": b"\xfd7zXZ\x00",
+    "zstd": b"\x28\xb5\x2f\xfd",
+}
+
+
+class LogRecord:
+    __slots__ = ("token", "x", "y", "elapsed_ns")
+
+    def __init__(self, token, x=None, y=None, elapsed_ns=0):
+        """
+        A single log line, independent of the file format\n
+        token is the first column of the text format (e.g. "+a", "1Button.left", "^")
+        and elapsed_ns is the time since the previous event in nanoseconds
+        """
+        self.token = token
+        self.x = x
+        self.y = y
+        self.elapsed_ns = elapsed_ns
+
+    def __eq__(self, other):
+        return (isinstance(other, LogRecord) and
+                (self.token, self.x, self.y, self.elapsed_ns) == (other.token, other.x, other.y, other.elapsed_ns))
+
+    def __repr__(self):
+        return "LogRecord({0!r}, {1!r}, {2!r}, {3!r})".format(self.token, self.x, self.y, self.elapsed_ns)
+
+
+def seconds_to_ns(seconds):
+    return round(float(seconds) * 1e9)
+
+
+def ns_to_seconds(ns):
+    return ns / 1e9
+
+
+def is_binary_log(file_name):
+    return os.path.splitext(file_name)[1] == binary_extension
+
+
+# compression
+def detect_compression(file_name):
+    """Returns "gzip", "lzma" or "zstd" for a compressed log, or None for an uncompressed one"""
+    with open(file_name, "rb") as f:
+        head = f.read(6)
+    for compression, magic in compression_magic.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+
+def open_log(file_name, mode="r", compression=None):
+    """
+    Opens a log file in any of the open() modes "r", "rb", "w" and "wb"\n
+    Reading detects compressed logs and decompresses them while they are read;
+    writing compresses with compression ("gzip", "lzma" or "zstd") if given
+    """
+    if "r" in mode:
+        compression = detect_compression(file_name)
+    if compression is None:
+        return open(file_name, mode)
+    if "b" not in mode:
+        mode = mode[0] + "t"
+    if compression == "gzip":
+        return gzip.open(file_name, mode)
+    if compression == "lzma":
+        return lzma.open(file_name, mode)
+    if compression == "zstd":
+        return open_zstd(file_name, mode)
+    raise ValueError("Unknown log compression: {0}".format(compression))
+
+
+def open_zstd(file_name, mode):
+    try:
+        from compression import zstd
+    except ImportError:
+        try:
+            import zstandard as zstd
+        except ImportError as e:
+            raise ImportError("zstd compressed logs require Python 3.14 or the zstandard package") from e
+    return zstd.open(file_name, mode)
+
+
+def compress_log(file_name, compression=None):
+    """Rewrites a log with compression, or uncompressed if compression is None, streaming it through a temporary file"""
+    temp_file_name = file_name + ".tmp"
+    with open_log(file_name, "rb") as src, open_log(temp_file_name, "wb", compression) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(temp_file_name, file_name)
+
+
+# text format
+def parse_coordinate(value):
+    """Returns an int for whole coordinates and a float for fractional ones, which some platforms report"""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def parse_text_line(line):
+    """Returns (LogRecord, is_raw) for a line of a text log"""
+    data = line.rstrip("\r\n").split(" ")
+    if len(data) > 1 and "," in data[1]:
+        xy = data[1].split(",")
+        x, y = parse_coordinate(xy[0]), parse_coordinate(xy[1])
+        times = data[2:]
+    else:
+        x = y = None
+        times = data[1:]
+    if not times:
+        raise ValueError("Missing time stamp: " + line.rstrip())
+    return LogRecord(data[0], x, y, seconds_to_ns(times[-1])), len(times) > 1
+
+
+def format_text_line(record, timer_ns=None):
+    """timer_ns is only given for raw logs, which also store the time since the recording started"""
+    data = [record.token]
+    if record.x is not None:
+        data.append("{0},{1}".format(record.x, record.y))
+    if timer_ns is not None:
+        data.append(str(ns_to_seconds(timer_ns)))
+    data.append(str(ns_to_seconds(record.elapsed_ns)))
+    return " ".join(data) + "\n"
+
+
+def read_text_log(file_name):
+    """Returns (records, is_raw)"""
+    records = []
+    is_raw = False
+    with open_log(file_name, "r") as f:
+        for line_num, line in enumerate(f, 1):
+            if not line.rstrip("\r\n"):
+                continue
+            try:
+                record, is_raw = parse_text_line(line)
+            except (ValueError, IndexError) as e:
+                raise ValueError("{0}, line {1}: {2}".format(file_name, line_num, e)) from e
+            records.append(record)
+    return records, is_raw
+
+
+def write_text_log(file_name, records, is_raw=False, compression=None):
+    timer_ns = 0
+    with open_log(file_name, "w", compression) as f:
+        for record in records:
+            if is_raw:
+                timer_ns += record.elapsed_ns
+                f.write(format_text_line(record, timer_ns))
+            else:
+                f.write(format_text_line(record))
+
+
+# binary format
+def pack_record(record, key_index, dx, dy):
+    """
+    Packs a record with the narrowest fields its values fit in\n
+    key_index is None for records without a key and dx, dy are None for records without coordinates;
+    fractional coordinates are given as absolute floats in dx, dy
+    """
+    flags = 0
+    fields = []
+    if key_index is not None:
+        if key_index <= 0xFF:
+            flags |= FLAG_HAS_KEY
+            fields.append(key_struct.pack(key_index))
+        else:
+            flags |= FLAG_HAS_KEY | FLAG_WIDE_KEY
+            fields.append(wide_key_struct.pack(key_index))
+    if dx is not None:
+        if isinstance(dx, float) or isinstance(dy, float):
+            flags |= FLAG_HAS_XY | FLAG_FLOAT_XY
+            fields.append(float_xy_struct.pack(dx, dy))
+        elif -0x8000 <= dx < 0x8000 and -0x8000 <= dy < 0x8000:
+            flags |= FLAG_HAS_XY
+            fields.append(xy_struct.pack(dx, dy))
+        else:
+            flags |= FLAG_HAS_XY | FLAG_WIDE_XY
+            fields.append(wide_xy_struct.pack(dx, dy))
+    if 0 <= record.elapsed_ns <= 0xFFFFFFFF:
+        fields.append(time_struct.pack(record.elapsed_ns))
+    else:
+        flags |= FLAG_WIDE_TIME
+        fields.append(wide_time_struct.pack(record.elapsed_ns))
+    return record_head_struct.pack(ord(record.token[0]), flags) + b"".join(fields)
+
+
+def write_binary_log(file_name, records, is_raw=False, compression=None):
+    """
+    Writes records as a header, an interned key table and variable-width records\n
+    Coordinates are stored as deltas from the previous event with coordinates and elapsed times in nanoseconds,
+    in 16 and 32 bit fields unless a value needs a wider one; fractional coordinates are stored as they are
+    """
+    key_table = {}
+    packed_records = []
+    prev_x = prev_y = 0
+    for record in records:
+        key = record.token[1:]
+        key_index = key_table.setdefault(key, len(key_table)) if key else None
+        if record.x is None:
+            packed_records.append(pack_record(record, key_index, None, None))
+        elif isinstance(record.x, float) or isinstance(record.y, float):
+            packed_records.append(pack_record(record, key_index, float(record.x), float(record.y)))
+        else:
+            packed_records.append(pack_record(record, key_index, record.x - prev_x, record.y - prev_y))
+            prev_x, prev_y = record.x, record.y
+    if len(key_table) > NO_KEY:
+        raise ValueError("Too many distinct keys for the binary log format")
+
+    with open_log(file_name, "wb", compression) as f:
+        f.write(header_struct.pack(BINARY_MAGIC, BINARY_VERSION, FLAG_RAW if is_raw else 0,
+                                   len(key_table), len(packed_records)))
+        for key in key_table:
+            key_bytes = key.encode("utf-8")
+            f.write(key_length_struct.pack(len(key_bytes)))
+            f.write(key_bytes)
+        f.write(b"".join(packed_records))
+
+
+def read_binary_header(f):
+    """Reads the header and key table from an open binary log; returns (keys, event_count, is_raw, version)"""
+    magic, version, flags, key_count, event_count = header_struct.unpack(f.read(header_struct.size))
+    if magic != BINARY_MAGIC:
+        raise ValueError("{0} is not a binary automation log".format(getattr(f, "name", f)))
+    if version > BINARY_VERSION:
+        raise ValueError("Unsupported binary log version: {0}".format(version))
+    keys = []
+    for _ in range(key_count):
+        (length,) = key_length_struct.unpack(f.read(key_length_struct.size))
+        keys.append(f.read(length).decode("utf-8"))
+    return keys, event_count, bool(flags & FLAG_RAW), version
+
+
+def read_binary_log(file_name):
+    """Returns (records, is_raw)"""
+    with LogStream(file_name) as stream:
+        return list(stream), stream.is_raw
+
+
+# format-independent access
+def read_log(file_name):
+    """Returns (records, is_raw) for a log in either format"""
+    if is_binary_log(file_name):
+        return read_binary_log(file_name)
+    return read_text_log(file_name)
+
+
+def write_log(file_name, records, is_raw=False, compression=None):
+    if is_binary_log(file_name):
+        write_binary_log(file_name, records, is_raw, compression)
+    else:
+        write_text_log(file_name, records, is_raw, compression)
+
+
+def text_to_binary(file_name, new_file_name=None):
+    """The new log is compressed the same way as the original"""
+    if new_file_name is None:
+        new_file_name = os.path.splitext(file_name)[0] + binary_extension
+    records, is_raw = read_text_log(file_name)
+    write_binary_log(new_file_name, records, is_raw, detect_compression(file_name))
+    return new_file_name
+
+
+def binary_to_text(file_name, new_file_name=None):
+    """The new log is compressed the same way as the original"""
+    if new_file_name is None:
+        new_file_name = os.path.splitext(file_name)[0] + text_extension
+    records, is_raw = read_binary_log(file_name)
+    write_text_log(new_file_name, records, is_raw, detect_compression(file_name))
+    return new_file_name
+
+
+class LogStream:
+    def __init__(self, file_name, chunk_records=4096):
+        """
+        Reads the records of a log in either format lazily\n
+        At most chunk_records binary records, or one buffered block of text, are held in memory.
+        Every iteration seeks back to the first record, so a log can be replayed without rereading its header\n
+        Compressed logs are decompressed as they are read and reopened for every iteration after the first
+        """
+        self.file_name = file_name
+        self.chunk_records = chunk_records
+        self.binary = is_binary_log(file_name)
+        self.compression = detect_compression(file_name)
+        self.keys = None
+        self.event_count = None
+        self.is_raw = None
+        self.version = None
+        self.file = None
+        self.data_start = None
+        self.iterated = False
+        self._open()
+
+    def __iter__(self):
+        if not self.iterated:
+            self.iterated = True
+        elif self.compression:
+            # seeking backwards in a compressed stream decompresses it from the start anyway
+            self.file.close()
+            self._open()
+        else:
+            self.file.seek(self.data_start)
+        if self.binary:
+            return self._iter_binary() if self.version >= 2 else self._iter_binary_v1()
+        return self._iter_text()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.file.close()
+
+    def _open(self):
+        if self.binary:
+            self.file = open_log(self.file_name, "rb")
+            self.keys, self.event_count, self.is_raw, self.version = read_binary_header(self.file)
+        else:
+            self.file = open_log(self.file_name, "r")
+        if not self.compression:
+            self.data_start = self.file.tell()
+
+    def _iter_binary(self):
+        keys = self.keys
+        remaining = self.event_count
+        x = y = 0
+        # every record has at least a head and a narrow time, so a block never holds more than chunk_records of them
+        block_size = self.chunk_records * (record_head_struct.size + time_struct.size)
+        data = b""
+        pos = 0
+        try:
+            while remaining:
+                if len(data) - pos < max_record_size:
+                    data = data[pos:] + self.file.read(block_size)
+                    pos = 0
+                kind, flags = record_head_struct.unpack_from(data, pos)
+                pos += 2
+                token = chr(kind)
+                if flags & FLAG_HAS_KEY:
+                    if flags & FLAG_WIDE_KEY:
+                        (key_index,) = wide_key_struct.unpack_from(data, pos)
+                        pos += 2
+                    else:
+                        key_index = data[pos]
+                        pos += 1
+                    token += keys[key_index]
+                record_x = record_y = None
+                if flags & FLAG_HAS_XY:
+                    if flags & FLAG_FLOAT_XY:
+                        record_x, record_y = float_xy_struct.unpack_from(data, pos)
+                        pos += 16
+                    else:
+                        if flags & FLAG_WIDE_XY:
+                            dx, dy = wide_xy_struct.unpack_from(data, pos)
+                            pos += 8
+                        else:
+                            dx, dy = xy_struct.unpack_from(data, pos)
+                            pos += 4
+                        x += dx
+                        y += dy
+                        record_x, record_y = x, y
+                if flags & FLAG_WIDE_TIME:
+                    (elapsed_ns,) = wide_time_struct.unpack_from(data, pos)
+                    pos += 8
+                else:
+                    (elapsed_ns,) = time_struct.unpack_from(data, pos)
+                    pos += 4
+                remaining -= 1
+                yield LogRecord(token, record_x, record_y, elapsed_ns)
+        except (struct.error, IndexError):
+            raise ValueError("{0} is truncated".format(self.file_name)) from None
+
+    def _iter_binary_v1(self):
+        keys = self.keys
+        remaining = self.event_count
+        x = y = 0
+        while remaining:
+            count = min(remaining, self.chunk_records)
+            data = self.file.read(count * v1_record_struct.size)
+            if len(data) != count * v1_record_struct.size:
+                raise ValueError("{0} is truncated".format(self.file_name))
+            remaining -= count
+            for kind, flags, key_index, dx, dy, elapsed_ns in v1_record_struct.iter_unpack(data):
+                token = chr(kind) if key_index == NO_KEY else chr(kind) + keys[key_index]
+                if flags & FLAG_HAS_XY:
+                    x += dx
+                    y += dy
+                    yield LogRecord(token, x, y, elapsed_ns)
+                else:
+                    yield LogRecord(token, None, None, elapsed_ns)
+
+    def _iter_text(self):
+        for line_num, line in enumerate(self.file, 1):
+            if not line.rstrip("\r\n"):
+                continue
+            try:
+                record, self.is_raw = parse_text_line(line)
+            except (ValueError, IndexError) as e:
+                raise ValueError("{0}, line {1}: {2}".format(self.file_name, line_num, e)) from e
+            yield record
@@ -0,0 +1,178 @@
+import ctypes
+import ctypes.util
+import os
+import os.path
+import select
+import struct
+import threading
+import time
+import log_format
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+watch_mask = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+# watch descriptor, mask, cookie, name length, followed by the nul-padded name
+inotify_event_struct = struct.Struct("iIII")
+
+
+class LogWatcher:
+    def __init__(self, log_dir, callback, debounce=0.2, max_delay=1.0, poll_interval=1.0, use_inotify=True):
+        """
+        Watches log_dir for added, removed, modified and renamed logs\n
+        Changes are debounced until the folder has been quiet for debounce seconds (at most max_delay),
+        then passed to callback(changes) from the watcher thread as a list of
+        ("added" | "removed" | "modified", file, None) and ("renamed", old_file, new_file) tuples\n
+        Uses inotify where available and otherwise polls every poll_interval seconds;
+        inotify is set when every change is reported as it happens
+        """
+        self.log_dir = log_dir
+        self.callback = callback
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.snapshot = stat_logs(log_dir)
+        self.dir_mtime = os.stat(log_dir).st_mtime_ns
+        self.files = set(self.snapshot)
+        self.touched = set()
+        self.renames = []
+        self.moved_from = {}
+        self.stop_event = threading.Event()
+        self.inotify_fd = open_inotify(log_dir) if use_inotify else None
+        self.inotify = self.inotify_fd is not None
+        self.thread = threading.Thread(target=self._run_inotify if self.inotify else self._run_polling, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+
+    def _run_inotify(self):
+        first_change = last_change = None
+        while not self.stop_event.is_set():
+            if last_change is None:
+                timeout = 0.5
+            else:
+                timeout = max(0.0, min(last_change + self.debounce, first_change + self.max_delay) - time.monotonic())
+            readable = select.select([self.inotify_fd], [], [], timeout)[0]
+            if readable:
+                self._read_events()
+                last_change = time.monotonic()
+                if first_change is None:
+                    first_change = last_change
+            elif last_change is not None:
+                self._flush()
+                first_change = last_change = None
+
+    def _read_events(self):
+        try:
+            data = os.read(self.inotify_fd, 65536)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = inotify_event_struct.unpack_from(data, offset)
+            offset += inotify_event_struct.size
+            file = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, so check every file
+                self.touched.update(self.files)
+                self.touched.update(list_logs(self.log_dir))
+            elif mask & IN_MOVED_FROM:
+                self.moved_from[cookie] = file
+            elif mask & IN_MOVED_TO and cookie in self.moved_from:
+                old_file = self.moved_from.pop(cookie)
+                if is_log(old_file) and is_log(file):
+                    self.renames.append((old_file, file))
+                else:
+                    self.touched.update(f for f in (old_file, file) if is_log(f))
+            elif is_log(file):
+                self.touched.add(file)
+
+    def _run_polling(self):
+        while not self.stop_event.wait(self.poll_interval):
+            # the folder only needs listing if entries were added, removed or renamed
+            dir_mtime = os.stat(self.log_dir).st_mtime_ns
+            if dir_mtime != self.dir_mtime:
+                snapshot = stat_logs(self.log_dir)
+            else:
+                snapshot = {file: os.stat(os.path.join(self.log_dir, file)) for file in self.snapshot
+                            if os.path.exists(os.path.join(self.log_dir, file))}
+            for file in self.snapshot.keys() | snapshot.keys():
+                old, new = self.snapshot.get(file), snapshot.get(file)
+                if old is None or new is None or (old.st_size, old.st_mtime_ns) != (new.st_size, new.st_mtime_ns):
+                    self.touched.add(file)
+            self.snapshot = snapshot
+            self.dir_mtime = dir_mtime
+            if self.touched:
+                self._flush()
+
+    def _flush(self):
+        changes = []
+        for old_file, new_file in self.renames:
+            if old_file in self.files:
+                self.files.discard(old_file)
+                self.files.add(new_file)
+                changes.append(("renamed", old_file, new_file))
+            else:
+                self.touched.add(new_file)
+        # a moved-out file without a matching move into the folder was removed
+        self.touched.update(f for f in self.moved_from.values() if is_log(f))
+        for file in sorted(self.touched):
+            exists = os.path.isfile(os.path.join(self.log_dir, file))
+            if exists and file not in self.files:
+                self.files.add(file)
+                changes.append(("added", file, None))
+            elif exists:
+                changes.append(("modified", file, None))
+            elif file in self.files:
+                self.files.discard(file)
+                changes.append(("removed", file, None))
+        self.renames = []
+        self.moved_from = {}
+        self.touched = set()
+        if changes:
+            self.callback(changes)
+
+
+def is_log(file):
+    return os.path.splitext(file)[1] in log_format.log_extensions
+
+
+def list_logs(log_dir):
+    with os.scandir(log_dir) as entries:
+        return [entry.name for entry in entries if is_log(entry.name) and entry.is_file()]
+
+
+def stat_logs(log_dir):
+    with os.scandir(log_dir) as entries:
+        return {entry.name: entry.stat() for entry in entries if is_log(entry.name) and entry.is_file()}
+
+
+def open_inotify(log_dir):
+    """Returns an inotify file descriptor watching log_dir, or None if inotify is unavailable"""
+    library = ctypes.util.find_library("c")
+    if library is None:
+        return None
+    libc = ctypes.CDLL(library, use_errno=True)
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if fd < 0:
+        return None
+    if libc.inotify_add_watch(fd, os.fsencode(log_dir), watch_mask) < 0:
+        os.close(fd)
+        return None
+    return fd
@@ -0,0 +1,183 @@
+import argparse
+import json
+import os
+import os.path
+import platform
+import random
+import tempfile
+import time
+import input_backends
+import log_format
+import player
+
+# name, event count, gap distribution, mean gap in seconds, key/click/scroll/move mix
+default_scenarios = [
+    {"name": "dispatch_keys", "events": 50000, "gaps": "zero", "mean_gap": 0.0, "mix": (1, 0, 0, 0)},
+    {"name": "dispatch_mixed", "events": 50000, "gaps": "zero", "mean_gap": 0.0, "mix": (4, 2, 1, 3)},
+    {"name": "constant_5ms", "events": 1000, "gaps": "constant", "mean_gap": 0.005, "mix": (4, 2, 1, 3)},
+    {"name": "uniform_10ms", "events": 500, "gaps": "uniform", "mean_gap": 0.01, "mix": (4, 2, 1, 3)},
+    {"name": "human_typing", "events": 300, "gaps": "exponential", "mean_gap": 0.02, "mix": (1, 0, 0, 0)},
+    {"name": "bursty_mouse", "events": 1000, "gaps": "bursty", "mean_gap": 0.005, "mix": (0, 2, 1, 6)},
+]
+quick_scale = 0.1
+
+
+def generate_gaps(count, distribution, mean_gap, rng):
+    if distribution == "zero":
+        return [0.0] * count
+    if distribution == "constant":
+        return [mean_gap] * count
+    if distribution == "uniform":
+        return [rng.uniform(0, 2 * mean_gap) for _ in range(count)]
+    if distribution == "exponential":
+        return [rng.expovariate(1 / mean_gap) for _ in range(count)]
+    if distribution == "bursty":
+        # mostly back-to-back events, with occasional pauses that keep the same mean
+        return [rng.uniform(0, 0.2 * mean_gap) if rng.random() < 0.9 else rng.uniform(0, 18.2 * mean_gap)
+                for _ in range(count)]
+    raise ValueError("Unknown gap distribution: " + distribution)
+
+
+def generate_records(event_count, distribution="exponential", mean_gap=0.01, mix=(1, 1, 1, 1), seed=0):
+    """Returns a synthetic list of log_format.LogRecords with a key/click/scroll/move mix weighted by mix"""
+    rng = random.Random(seed)
+    gaps = iter(generate_gaps(event_count, distribution, mean_gap, rng))
+    records = []
+    x, y = 500, 500
+    while len(records) < event_count:
+        kind = rng.choices(("key", "click", "scroll", "move"), weights=mix)[0]
+        if kind == "key":
+            key = rng.choice("abcdefghijklmnopqrstuvwxyz" if rng.random() < 0.9 else ["Key.shift", "Key.space", "Key.enter"])
+            tokens = ["+" + key, "-" + key]
+            xy = None
+        elif kind == "click":
+            tokens = ["1Button.left", "0Button.left"]
+            xy = (x, y)
+        elif kind == "scroll":
+            tokens = [rng.choice("^_")]
+            xy = (x, y)
+        else:
+            x = min(max(x + rng.randint(-40, 40), 0), 1919)
+            y = min(max(y + rng.randint(-40, 40), 0), 1079)
+            tokens = ["m"]
+            xy = (x, y)
+        for token in tokens[:event_count - len(records)]:
+            records.append(log_format.LogRecord(token, xy and xy[0], xy and xy[1], log_format.seconds_to_ns(next(gaps))))
+    return records
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_scenario(scenario, directory, spin_threshold=0.002, binary=False, seed=0):
+    """Generates the scenario's log, plays it against a MockBackend and returns its measurements"""
+    extension = log_format.binary_extension if binary else log_format.text_extension
+    path = os.path.join(directory, scenario["name"] + extension)
+    log_format.write_log(path, generate_records(scenario["events"], scenario["gaps"], scenario["mean_gap"],
+                                                scenario["mix"], seed))
+
+    load_start = time.perf_counter()
+    events = player.parse_log_file(path)
+    backend = input_backends.MockBackend()
+    program = player.bind_events(events, backend)
+    load_time = time.perf_counter() - load_start
+
+    scheduler = player.PlaybackScheduler(spin_threshold=spin_threshold)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    report = player.play(program, backend, scheduler=scheduler)
+    wall_time = time.perf_counter() - wall_start
+    cpu_time = time.process_time() - cpu_start
+
+    # the action call is the last one made for each event; events with coordinates move the mouse first
+    lateness = []
+    call_index = -1
+    start_ns = scheduler.start_time * 1e9
+    for offset, xy, _, _ in program:
+        call_index += 2 if xy else 1
+        lateness.append((backend.calls[call_index][0] - start_ns) / 1e9 - offset)
+    lateness.sort()
+    scheduled_time = program[-1][0] if program else 0.0
+    return {
+        "name": scenario["name"],
+        "events": len(program),
+        "gaps": scenario["gaps"],
+        "mean_gap": scenario["mean_gap"],
+        "load_time": load_time,
+        "scheduled_time": scheduled_time,
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "cpu_per_event_us": cpu_time / len(program) * 1e6 if program else 0.0,
+        "throughput": len(program) / wall_time if wall_time else 0.0,
+        "lateness_p50_ms": percentile(lateness, 0.5) * 1000,
+        "lateness_p90_ms": percentile(lateness, 0.9) * 1000,
+        "lateness_p99_ms": percentile(lateness, 0.99) * 1000,
+        "lateness_max_ms": (lateness[-1] if lateness else 0.0) * 1000,
+        "drift_ms": (wall_time - scheduled_time) * 1000,
+        "scheduler_max_lateness_ms": report["max_lateness"] * 1000,
+    }
+
+
+def run_benchmarks(scenarios=None, spin_threshold=0.002, binary=False, quick=False, seed=0):
+    if scenarios is None:
+        scenarios = default_scenarios
+    if quick:
+        scenarios = [dict(scenario, events=max(10, int(scenario["events"] * quick_scale))) for scenario in scenarios]
+    with tempfile.TemporaryDirectory() as directory:
+        results = [run_scenario(scenario, directory, spin_threshold, binary, seed) for scenario in scenarios]
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "spin_threshold": spin_threshold,
+        "binary": binary,
+        "scenarios": results,
+    }
+
+
+def compare(results, baseline):
+    """Returns lines comparing each scenario's measurements with a baseline results dict"""
+    baseline_scenarios = {scenario["name"]: scenario for scenario in baseline["scenarios"]}
+    lines = []
+    for scenario in results["scenarios"]:
+        old = baseline_scenarios.get(scenario["name"])
+        if old is None:
+            continue
+        for metric in ("throughput", "cpu_per_event_us", "lateness_p99_ms", "drift_ms"):
+            if old[metric]:
+                lines.append("{0:<16} {1:<18} {2:>12.3f} -> {3:>12.3f} ({4:+.1f}%)".format(
+                    scenario["name"], metric, old[metric], scenario[metric],
+                    (scenario[metric] - old[metric]) / abs(old[metric]) * 100))
+    return lines
+
+
+def format_results(results):
+    lines = ["{0:<16} {1:>7} {2:>12} {3:>9} {4:>9} {5:>9} {6:>9} {7:>10}".format(
+        "scenario", "events", "events/s", "cpu us/ev", "p50 ms", "p99 ms", "max ms", "drift ms")]
+    for s in results["scenarios"]:
+        lines.append("{0:<16} {1:>7} {2:>12.0f} {3:>9.2f} {4:>9.3f} {5:>9.3f} {6:>9.3f} {7:>10.3f}".format(
+            s["name"], s["events"], s["throughput"], s["cpu_per_event_us"], s["lateness_p50_ms"],
+            s["lateness_p99_ms"], s["lateness_max_ms"], s["drift_ms"]))
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures playback timing fidelity against a mock input backend")
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--baseline", help="compare with a previous JSON result")
+    parser.add_argument("--spin-threshold", type=float, default=0.002)
+    parser.add_argument("--binary", action="store_true", help="use the binary log format")
+    parser.add_argument("--quick", action="store_true", help="run scaled-down scenarios")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(spin_threshold=args.spin_threshold, binary=args.binary, quick=args.quick)
+    print("\n".join(format_results(benchmark_results)))
+    if args.baseline:
+        with open(args.baseline) as f:
+            print("\n".join(compare(benchmark_results, json.load(f))))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(benchmark_results, f, indent=2)
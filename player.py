@@ -0,0 +1,374 @@
+import threading
+import time
+import log_format
+
+scroll_steps = {
+    "^": (0, -1),
+    "_": (0, 1),
+    "<": (-1, 0),
+    ">": (1, 0),
+}
+
+
+class PlaybackEvent:
+    __slots__ = ("kind", "target", "x", "y", "delay")
+
+    def __init__(self, kind, target=None, x=None, y=None, delay=0.0):
+        """
+        A single parsed log event\n
+        kind is the event's log prefix ("+", "-", "1", "0", "^", "_", "<", ">", "m", "w", "a")
+        and target is the key or button name as logged (e.g. "a", "Key.shift", "Button.left"), if any\n
+        A "w" event waits until its target condition is met on the screen (see screen_match.ScreenWaits.get_condition()),
+        for at most delay seconds after the previous event; an "a" event checks its condition once and ends playback if it fails
+        """
+        self.kind = kind
+        self.target = target
+        self.x = x
+        self.y = y
+        self.delay = delay
+
+    def __reduce__(self):
+        return PlaybackEvent, (self.kind, self.target, self.x, self.y, self.delay)
+
+    def __repr__(self):
+        return "PlaybackEvent({0!r}, {1!r}, {2!r}, {3!r}, {4!r})".format(self.kind, self.target, self.x, self.y, self.delay)
+
+
+def event_from_record(record, time_precision=10):
+    kind = record.token[0]
+    if kind in "+-10wa":
+        target = record.token[1:]
+        if not target:
+            raise ValueError("Missing key, button or condition: " + record.token)
+    elif kind in "^_<>m":
+        target = None
+    else:
+        raise ValueError("Unrecognized log event: " + record.token)
+    return PlaybackEvent(kind, target, record.x, record.y, round(log_format.ns_to_seconds(record.elapsed_ns), time_precision))
+
+
+def parse_log_file(log, time_precision=10):
+    """Parses a log file in either format into a list of PlaybackEvents"""
+    with log_format.LogStream(log) as records:
+        return list(iter_events(records, time_precision, log))
+
+
+def events_to_rows(events):
+    """Returns events as [kind, target, x, y, delay] rows that can be saved as JSON"""
+    return [[event.kind, event.target, event.x, event.y, event.delay] for event in events]
+
+
+def events_from_rows(rows):
+    return [PlaybackEvent(*row) for row in rows]
+
+
+def iter_events(records, time_precision=10, log=None):
+    """Lazily converts log_format.LogRecords into PlaybackEvents"""
+    for i, record in enumerate(records, 1):
+        try:
+            yield event_from_record(record, time_precision)
+        except ValueError as e:
+            raise ValueError("{0}, event {1}: {2}".format(log, i, e)) from e
+
+
+def retime_events(events, speed=1.0, max_gap=None, gap_replacement=None):
+    """
+    Returns events with their delays adjusted for playback\n
+    Recorded gaps longer than max_gap seconds are replaced by gap_replacement (max_gap by default),
+    then every delay is divided by speed\n
+    Wait timeouts are kept as they are, since they bound how long the screen takes rather than the input
+    """
+    return list(iter_retimed(events, speed, max_gap, gap_replacement))
+
+
+def iter_retimed(events, speed=1.0, max_gap=None, gap_replacement=None):
+    if speed <= 0:
+        raise ValueError("speed must be positive")
+    if max_gap is not None and gap_replacement is None:
+        gap_replacement = max_gap
+    for event in events:
+        if event.kind == "w":
+            yield event
+            continue
+        delay = event.delay
+        if max_gap is not None and delay > max_gap:
+            delay = gap_replacement
+        yield PlaybackEvent(event.kind, event.target, event.x, event.y, delay / speed)
+
+
+def bind_events(events, backend, screen=None):
+    """
+    Binds PlaybackEvents to an input_backends.InputBackend\n
+    Returns a list of (offset, xy, function, args) tuples ready for dispatch,
+    where offset is the event's time in seconds from the start of the log\n
+    Wait and check events are bound to (wait or check, (target, condition)) with the condition from
+    screen.get_condition(target), screen being a screen_match.ScreenWaits;
+    the offset of a wait is the deadline at which it times out
+    """
+    return list(iter_bound(events, backend, screen))
+
+
+def wait(target, condition):
+    """Stands in for wait events in bound programs; play() runs them through PlaybackScheduler.wait_for()"""
+    return condition()
+
+
+def check(target, condition):
+    """Stands in for check events in bound programs; play() ends playback if condition() is False"""
+    return condition()
+
+
+def iter_bound(events, backend, screen=None):
+    actions = {
+        "+": (backend.press, backend.resolve_key),
+        "-": (backend.release, backend.resolve_key),
+        "1": (backend.press_button, backend.resolve_button),
+        "0": (backend.release_button, backend.resolve_button),
+    }
+    resolved = {}
+    offset = 0.0
+    for event in events:
+        offset += event.delay
+        xy = (event.x, event.y) if event.x is not None else None
+        if event.kind == "m":
+            yield offset, None, backend.move_to, xy
+        elif event.kind == "w" or event.kind == "a":
+            if screen is None:
+                raise ValueError("Wait and check events need a screen: " + event.target)
+            condition = resolved.get((screen, event.target))
+            if condition is None:
+                condition = resolved[(screen, event.target)] = screen.get_condition(event.target)
+            yield offset, None, wait if event.kind == "w" else check, (event.target, condition)
+        elif event.kind in scroll_steps:
+            yield offset, xy, backend.scroll, scroll_steps[event.kind]
+        else:
+            func, resolve = actions[event.kind]
+            target = resolved.get((resolve, event.target))
+            if target is None:
+                target = resolved[(resolve, event.target)] = resolve(event.target)
+            yield offset, xy, func, (target,)
+
+
+def stream_program(log_stream, backend, time_precision=10, speed=1.0, max_gap=None, gap_replacement=None, screen=None):
+    """
+    Returns a function that creates a new lazy program over a log_format.LogStream for each repeat,
+    for use with play() on logs too large to hold in memory
+    """
+    def program():
+        events = iter_events(log_stream, time_precision, log_stream.file_name)
+        if speed != 1.0 or max_gap is not None:
+            events = iter_retimed(events, speed, max_gap, gap_replacement)
+        return iter_bound(events, backend, screen)
+    return program
+
+
+class PlaybackControl:
+    def __init__(self):
+        """
+        Stop and pause/resume signals shared between the player and its hotkey listener\n
+        Waits wake up as soon as stop() or toggle_pause() is called from any thread
+        """
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.paused = False
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def toggle_pause(self):
+        with self.condition:
+            self.paused = not self.paused
+            self.condition.notify_all()
+
+    def wait(self, timeout):
+        """Returns True if the wait was interrupted by stop() or a pause"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.stopped or self.paused, timeout)
+
+    def wait_while_paused(self):
+        """Blocks until resumed or stopped and returns the time spent paused"""
+        pause_time = time.perf_counter()
+        with self.condition:
+            self.condition.wait_for(lambda: self.stopped or not self.paused)
+        return time.perf_counter() - pause_time
+
+
+class PlaybackScheduler:
+    def __init__(self, spin_threshold=0.002, control=None, poll_interval=0.005, poll_ratio=4.0):
+        """
+        Waits for events against absolute deadlines measured from start()\n
+        Sleeps until spin_threshold seconds before a deadline, then spins for the remainder
+        so that sleep overshoot and dispatch cost do not accumulate into drift\n
+        The sleep is a wait on control, so stopping or pausing takes effect immediately\n
+        Wait event conditions are checked every poll_interval seconds, or every poll_ratio times as long as
+        a check takes if that is longer, so cheap pixel checks are polled often and template matches do not hog the CPU
+        """
+        self.spin_threshold = spin_threshold
+        self.poll_interval = poll_interval
+        self.poll_ratio = poll_ratio
+        self.control = control if control is not None else PlaybackControl()
+        self.start_time = None
+        self.event_count = 0
+        self.late_count = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self.last_lateness = 0.0
+        self.wait_count = 0
+        self.time_saved = 0.0
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.event_count = 0
+        self.late_count = 0
+        self.total_lateness = 0.0
+        self.max_lateness = 0.0
+        self.last_lateness = 0.0
+        self.wait_count = 0
+        self.time_saved = 0.0
+
+    def wait_until(self, offset):
+        """Returns False if playback was stopped before the deadline"""
+        control = self.control
+        while True:
+            if control.stopped:
+                return False
+            if control.paused:
+                # shift the schedule so that the pause is not counted as lateness
+                self.start_time += control.wait_while_paused()
+                continue
+            deadline = self.start_time + offset
+            remaining = deadline - time.perf_counter()
+            if remaining > self.spin_threshold and control.wait(remaining - self.spin_threshold):
+                continue
+            break
+        current_time = time.perf_counter()
+        while current_time < deadline:
+            current_time = time.perf_counter()
+        self._record_lateness(current_time - deadline)
+        return True
+
+    def wait_for(self, offset, condition):
+        """
+        Checks condition() until it returns True or the deadline at offset passes\n
+        A condition met before the deadline shifts the schedule earlier,
+        so that the following events keep their recorded gaps from the moment it was met\n
+        Returns False if the deadline passed or playback was stopped first
+        """
+        control = self.control
+        while True:
+            if control.stopped:
+                return False
+            if control.paused:
+                self.start_time += control.wait_while_paused()
+                continue
+            check_start = time.perf_counter()
+            if condition():
+                break
+            check_end = time.perf_counter()
+            remaining = self.start_time + offset - check_end
+            if remaining <= 0:
+                return False
+            control.wait(min(max(self.poll_interval, self.poll_ratio * (check_end - check_start)), remaining))
+        early = self.start_time + offset - time.perf_counter()
+        if early > 0:
+            self.start_time -= early
+        self.wait_count += 1
+        self.time_saved += max(early, 0.0)
+        return True
+
+    def _record_lateness(self, lateness):
+        self.event_count += 1
+        self.last_lateness = lateness
+        self.total_lateness += lateness
+        if lateness > self.max_lateness:
+            self.max_lateness = lateness
+        if lateness > self.spin_threshold:
+            self.late_count += 1
+
+    def get_report(self):
+        """Returns how far behind schedule playback fell, in seconds"""
+        return {
+            "events": self.event_count,
+            "late_events": self.late_count,
+            "max_lateness": self.max_lateness,
+            "mean_lateness": self.total_lateness / self.event_count if self.event_count else 0.0,
+            "final_lateness": self.last_lateness,
+            "waits": self.wait_count,
+            "wait_time_saved": self.time_saved,
+        }
+
+
+def release_held(held):
+    """Releases each (release function, args) in held, most recent first, carrying on past failures"""
+    for release, args in reversed(list(held)):
+        try:
+            release(*args)
+        except Exception:
+            pass
+    held.clear()
+
+
+def play(program, backend, repeat_num=1, scheduler=None, progress=None, progress_interval=0.1):
+    """
+    Dispatches a bound program against deadlines measured from a single start time\n
+    program is a list from bind_events() or a function from stream_program()\n
+    progress(repeat, events_done) is called at most every progress_interval seconds and after each repeat\n
+    Returns the scheduler's report, with "stopped" set if playback was stopped early
+    and "wait_timeout" or "failed_check" set to the target of a wait event that timed out
+    or a check event that failed, which also end playback\n
+    Keys and buttons still held when playback ends, however it ends, are released
+    """
+    if scheduler is None:
+        scheduler = PlaybackScheduler()
+    move_to = backend.move_to
+    wait_until = scheduler.wait_until
+    releases = {backend.press: backend.release, backend.press_button: backend.release_button}
+    release_funcs = set(releases.values())
+    held = {}
+    scheduler.start()
+    base = 0.0
+    next_progress = 0.0
+    wait_timeout = None
+    failed_check = None
+    try:
+        for run_num in range(repeat_num):
+            offset = 0.0
+            index = 0
+            for index, (offset, xy, func, args) in enumerate(program() if callable(program) else program, 1):
+                if func is wait:
+                    if not scheduler.wait_for(base + offset, args[1]):
+                        if not scheduler.control.stopped:
+                            wait_timeout = args[0]
+                        break
+                    continue
+                if not wait_until(base + offset):
+                    break
+                if func is check:
+                    if not args[1]():
+                        failed_check = args[0]
+                        break
+                    continue
+                if xy:
+                    move_to(*xy)
+                func(*args)
+                if func in releases:
+                    held[releases[func], args] = None
+                elif func in release_funcs:
+                    held.pop((func, args), None)
+                if progress and time.perf_counter() >= next_progress:
+                    progress(run_num, index)
+                    next_progress = time.perf_counter() + progress_interval
+            if scheduler.control.stopped or wait_timeout or failed_check:
+                break
+            if progress:
+                progress(run_num, index)
+            base += offset
+    finally:
+        release_held(held)
+    report = scheduler.get_report()
+    report["stopped"] = scheduler.control.stopped
+    report["wait_timeout"] = wait_timeout
+    report["failed_check"] = failed_check
+    return report
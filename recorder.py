@@ -0,0 +1,306 @@
+import math
+import threading
+import log_format
+
+
+class LogPostProcessor:
+    def __init__(self, write, compress_held_keys=True, move_tolerance=None, max_move_run=1000, event_times=None):
+        """
+        Post-processes raw events one at a time and passes the finished log lines to write()\n
+        Held keys are compressed and elapsed times recomputed as events arrive;
+        runs of mouse moves are buffered and simplified once the run ends\n
+        If event_times is a list, the timer_ns of every written event is appended to it\n
+        Use get_summary() for autorepeat, hold duration and stuck key statistics
+        """
+        self.write = write
+        self.compress_held_keys = compress_held_keys
+        self.move_tolerance = move_tolerance
+        self.max_move_run = max_move_run
+        self.event_times = event_times
+        self.held_keys = {}
+        self.key_stats = {}
+        self.move_run = []
+        self.prev_time = 0
+        self.event_count = 0
+
+    def add(self, token, x, y, timer_ns):
+        """timer_ns is the event's time since the recording started"""
+        if token == "m" and self.move_tolerance is not None:
+            self.move_run.append((x, y, timer_ns))
+            if len(self.move_run) >= self.max_move_run:
+                self._flush_moves()
+            return
+        self._flush_moves()
+        # account for held keys
+        if token[0] == "+":
+            key = token[1:]
+            stats = self.key_stats.get(key)
+            if stats is None:
+                stats = self.key_stats[key] = {"presses": 0, "repeats": 0, "total_hold": 0.0, "max_hold": 0.0}
+            if key in self.held_keys:
+                # a press while the key is held is an autorepeat
+                stats["repeats"] += 1
+                if self.compress_held_keys:
+                    return
+            else:
+                stats["presses"] += 1
+                self.held_keys[key] = timer_ns
+        elif token[0] == "-":
+            key = token[1:]
+            press_time = self.held_keys.pop(key, None)
+            if press_time is not None:
+                hold = log_format.ns_to_seconds(timer_ns - press_time)
+                stats = self.key_stats[key]
+                stats["total_hold"] += hold
+                if hold > stats["max_hold"]:
+                    stats["max_hold"] = hold
+        self._write_event(token, x, y, timer_ns)
+
+    def finish(self):
+        self._flush_moves()
+
+    def get_summary(self):
+        """
+        Returns the number of events written, the number of autorepeat presses
+        and how many of them were left out of the log, per-key press/repeat counts and hold durations in seconds,
+        and the stuck keys that were pressed but never released
+        """
+        repeats = sum(stats["repeats"] for stats in self.key_stats.values())
+        return {
+            "events": self.event_count,
+            "repeats": repeats,
+            "repeats_suppressed": repeats if self.compress_held_keys else 0,
+            "keys": self.key_stats,
+            "stuck_keys": list(self.held_keys),
+        }
+
+    def _write_event(self, token, x, y, timer_ns):
+        self.write(log_format.format_text_line(log_format.LogRecord(token, x, y, timer_ns - self.prev_time)))
+        self.prev_time = timer_ns
+        self.event_count += 1
+        if self.event_times is not None:
+            self.event_times.append(timer_ns)
+
+    def _flush_moves(self):
+        if not self.move_run:
+            return
+        points = [(x, y) for x, y, _ in self.move_run]
+        for i in simplify_path(points, self.move_tolerance):
+            x, y, timer_ns = self.move_run[i]
+            self._write_event("m", x, y, timer_ns)
+        self.move_run = []
+
+
+class RecordingWriter:
+    def __init__(self, file_name=None, raw_file_name=None, compress_held_keys=True, move_tolerance=None,
+                 capacity=65536, flush_interval=0.05, progress=None, compression=None, event_times=None):
+        """
+        Buffers raw (kind, target, x, y, log_format.clock_ns) records from the listener callbacks
+        in a preallocated ring buffer and writes them from a separate thread\n
+        Events are post-processed into file_name as they arrive;
+        raw_file_name is an optional side output of the unprocessed events\n
+        progress(event_count) is called from the writer thread after each flush that wrote events\n
+        With compression, both outputs are compressed and only flushed to disk when closed\n
+        If event_times is a list, the time since start() of every event in the main output
+        (file_name, or raw_file_name without it) is appended to it\n
+        Use push() from the callbacks, start() before recording and close() when finished
+        """
+        self.records = [None] * capacity
+        self.capacity = capacity
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.flush_interval = flush_interval
+        self.progress = progress
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.compression = compression
+        self.file = log_format.open_log(file_name, "w", compression) if file_name else None
+        self.raw_file = log_format.open_log(raw_file_name, "w", compression) if raw_file_name else None
+        self.processor = None
+        self.event_times = event_times
+        if self.file:
+            self.processor = LogPostProcessor(self.file.write, compress_held_keys, move_tolerance, event_times=event_times)
+        self.start_time = log_format.clock_ns()
+        self.prev_timer = 0
+        self.raw_event_count = 0
+
+    def start(self):
+        self.start_time = log_format.clock_ns()
+        self.prev_timer = 0
+        self.thread.start()
+
+    def push(self, record):
+        with self.lock:
+            if self.head - self.tail >= self.capacity:
+                self.dropped += 1
+                return
+            self.records[self.head % self.capacity] = record
+            self.head += 1
+
+    def drain(self):
+        with self.lock:
+            head = self.head
+            tail = self.tail
+        batch = [self.records[i % self.capacity] for i in range(tail, head)]
+        with self.lock:
+            self.tail = head
+        return batch
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        if self.processor:
+            self.processor.finish()
+        for f in (self.file, self.raw_file):
+            if f:
+                f.close()
+
+    def _run(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        raw_lines = []
+        batch = self.drain()
+        for kind, target, x, y, time_ns in batch:
+            timer_ns = time_ns - self.start_time
+            for token in record_tokens(kind, target):
+                if self.raw_file:
+                    record = log_format.LogRecord(token, x, y, timer_ns - self.prev_timer)
+                    raw_lines.append(log_format.format_text_line(record, timer_ns))
+                    self.raw_event_count += 1
+                    if self.event_times is not None and not self.processor:
+                        self.event_times.append(timer_ns)
+                if self.processor:
+                    self.processor.add(token, x, y, timer_ns)
+                self.prev_timer = timer_ns
+        if raw_lines:
+            self.raw_file.write("".join(raw_lines))
+        if not self.compression:
+            for f in (self.file, self.raw_file):
+                if f:
+                    f.flush()
+        if batch and self.progress:
+            self.progress(self.tail)
+
+
+def record_tokens(kind, target):
+    """Returns the log tokens for a raw recorder record"""
+    if kind == "+" or kind == "-":
+        return (kind + key_to_string(target),)
+    if kind == "1" or kind == "0":
+        return (kind + str(target),)
+    if kind == "s":
+        dx, dy = target
+        return ("_" if dy < 0 else "^", "<" if dx < 0 else ">")
+    return (kind,)
+
+
+def key_to_string(key):
+    char = getattr(key, "char", None)
+    if char is None:
+        return str(key)
+    return char
+
+
+def make_callbacks(push, stop, stop_recording_key, record_mouse_moves=False, move_min_distance=3, move_min_interval=0.01):
+    """
+    Returns (keyboard callbacks, mouse callbacks) as keyword arguments for the pynput listeners,
+    and flush_moves() to call once the listeners have stopped\n
+    The callbacks only timestamp each event and push() it as a raw record;
+    stop() is called when stop_recording_key is pressed\n
+    Moves within move_min_interval of the last kept move are held back rather than dropped;
+    the latest one is pushed, with its own time, before the next other event or by flush_moves(),
+    so the pointer's final position is always recorded
+    """
+    def flush_moves():
+        if pending_move:
+            last_move[:] = pending_move
+            push(("m", None, pending_move[0], pending_move[1], pending_move[2]))
+            pending_move.clear()
+
+    def log_key(key):
+        time_ns = clock_ns()
+        flush_moves()
+        # test for the stop_recording key
+        try:
+            if key.char == stop_recording_key:
+                stop()
+                return
+        except AttributeError:
+            if key == stop_recording_key:
+                stop()
+                return
+        # log key
+        push(("+", key, None, None, time_ns))
+
+    def log_unkey(key):
+        time_ns = clock_ns()
+        flush_moves()
+        push(("-", key, None, None, time_ns))
+
+    def log_click(x, y, button, pressed):
+        time_ns = clock_ns()
+        flush_moves()
+        push(("1" if pressed else "0", button, x, y, time_ns))
+
+    def log_scroll(x, y, dx, dy):
+        time_ns = clock_ns()
+        flush_moves()
+        push(("s", (dx, dy), x, y, time_ns))
+
+    def log_move(x, y):
+        # decimate the raw move stream before it reaches the buffer
+        time_ns = clock_ns()
+        prev_x, prev_y, prev_time = last_move
+        if (x - prev_x) ** 2 + (y - prev_y) ** 2 < min_distance_squared:
+            return
+        if time_ns - prev_time < min_interval_ns:
+            pending_move[:] = x, y, time_ns
+            return
+        pending_move.clear()
+        last_move[:] = x, y, time_ns
+        push(("m", None, x, y, time_ns))
+
+    clock_ns = log_format.clock_ns
+    last_move = [0, 0, 0]
+    pending_move = []
+    min_interval_ns = int(move_min_interval * 1e9)
+    min_distance_squared = move_min_distance ** 2
+    keyboard_callbacks = {"on_press": log_key, "on_release": log_unkey}
+    mouse_callbacks = {"on_click": log_click, "on_scroll": log_scroll, "on_move": log_move if record_mouse_moves else None}
+    return keyboard_callbacks, mouse_callbacks, flush_moves
+
+
+def simplify_path(points, tolerance):
+    """Ramer-Douglas-Peucker simplification of [(x, y), ...]; returns the indices of the points to keep"""
+    if len(points) < 3:
+        return list(range(len(points)))
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        x1, y1 = points[start]
+        x2, y2 = points[end]
+        dx, dy = x2 - x1, y2 - y1
+        length = math.hypot(dx, dy)
+        max_distance = 0.0
+        index = None
+        for i in range(start + 1, end):
+            px, py = points[i]
+            if length:
+                distance = abs(dy * (px - x1) - dx * (py - y1)) / length
+            else:
+                distance = math.hypot(px - x1, py - y1)
+            if distance > max_distance:
+                max_distance = distance
+                index = i
+        if index is not None and max_distance > tolerance:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+    return [i for i, kept in enumerate(keep) if kept]
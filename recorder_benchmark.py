@@ -0,0 +1,181 @@
+import argparse
+import json
+import os.path
+import platform
+import tempfile
+import threading
+import time
+import log_format
+import recorder
+
+default_paths = ("keyboard", "click", "scroll", "move")
+default_rates = (100, 1000, 0)
+
+
+class SyntheticKey:
+    """Stands in for a pynput KeyCode without a character, so that it is logged by its sequence number as "<n>\""""
+    char = None
+
+    def __init__(self, n):
+        self.n = n
+
+    def __str__(self):
+        return "<{0}>".format(self.n)
+
+
+class SyntheticButton:
+    def __str__(self):
+        return "Button.left"
+
+
+def inject(callback, args_for, count, rate, inject_times, durations):
+    """Calls callback(*args_for(i)) count times at rate events per second (0 for as fast as possible)"""
+    interval_ns = int(1e9 / rate) if rate else 0
+    start_ns = time.perf_counter_ns()
+    for i in range(count):
+        if interval_ns:
+            deadline = start_ns + i * interval_ns
+            remaining = deadline - time.perf_counter_ns()
+            if remaining > 2000000:
+                time.sleep((remaining - 2000000) / 1e9)
+            while time.perf_counter_ns() < deadline:
+                pass
+        args = args_for(i)
+        before = time.perf_counter_ns()
+        callback(*args)
+        durations[i] = time.perf_counter_ns() - before
+        inject_times[i] = before
+
+
+def sequence_number(record):
+    """Returns the injected event's sequence number for a logged record, or None for secondary lines"""
+    if record.token[0] == "+":
+        return int(record.token[2:-1])
+    if record.token[0] in "1m_":
+        return record.x
+    return None
+
+
+def histogram(values):
+    """Counts values in power-of-two nanosecond buckets"""
+    buckets = {}
+    for value in values:
+        bucket = 1 << max(int(value), 1).bit_length()
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    return {"<{0}ns".format(bucket): buckets[bucket] for bucket in sorted(buckets)}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_path(path, count, rate, directory, process=False, capacity=65536, flush_interval=0.05):
+    """Drives one recorder callback path with synthetic events and returns its measurements"""
+    raw_file_name = os.path.join(directory, "{0}_{1}_RAW.log".format(path, rate))
+    file_name = os.path.join(directory, "{0}_{1}.log".format(path, rate)) if process else None
+    writer = recorder.RecordingWriter(file_name, raw_file_name, capacity=capacity, flush_interval=flush_interval)
+    keyboard_callbacks, mouse_callbacks, _ = recorder.make_callbacks(writer.push, lambda: None, object(),
+                                                                     record_mouse_moves=True, move_min_distance=0,
+                                                                     move_min_interval=0)
+    button = SyntheticButton()
+    if path == "keyboard":
+        callback, args_for = keyboard_callbacks["on_press"], lambda i: (SyntheticKey(i),)
+    elif path == "click":
+        callback, args_for = mouse_callbacks["on_click"], lambda i: (i, 0, button, True)
+    elif path == "scroll":
+        callback, args_for = mouse_callbacks["on_scroll"], lambda i: (i, 0, 0, -1)
+    elif path == "move":
+        callback, args_for = mouse_callbacks["on_move"], lambda i: (i, 0)
+    else:
+        raise ValueError("Unknown recorder path: " + path)
+
+    inject_times = [0] * count
+    durations = [0] * count
+    writer.start()
+    injector = threading.Thread(target=inject, args=(callback, args_for, count, rate, inject_times, durations))
+    wall_start = time.perf_counter()
+    injector.start()
+    injector.join()
+    wall_time = time.perf_counter() - wall_start
+    writer.close()
+
+    # match logged events to injected ones
+    skews = []
+    seen = set()
+    reordered = 0
+    last_seen = -1
+    timer_ns = 0
+    for record in log_format.read_text_log(raw_file_name)[0]:
+        timer_ns += record.elapsed_ns
+        n = sequence_number(record)
+        if n is None:
+            continue
+        if n < last_seen:
+            reordered += 1
+        last_seen = max(last_seen, n)
+        seen.add(n)
+        skews.append(writer.start_time + timer_ns - inject_times[n])
+    durations.sort()
+    skews.sort()
+    return {
+        "path": path,
+        "rate": rate,
+        "events": count,
+        "achieved_rate": count / wall_time if wall_time else 0.0,
+        "logged": len(seen),
+        "dropped": count - len(seen),
+        "buffer_overflows": writer.dropped,
+        "reordered": reordered,
+        "callback_p50_ns": percentile(durations, 0.5),
+        "callback_p99_ns": percentile(durations, 0.99),
+        "callback_max_ns": durations[-1] if durations else 0,
+        "callback_histogram": histogram(durations),
+        "skew_p50_ns": percentile(skews, 0.5),
+        "skew_p99_ns": percentile(skews, 0.99),
+        "skew_max_ns": skews[-1] if skews else 0,
+    }
+
+
+def run_benchmarks(paths=default_paths, rates=default_rates, count=5000, process=False, capacity=65536, flush_interval=0.05):
+    with tempfile.TemporaryDirectory() as directory:
+        results = [run_path(path, count, rate, directory, process, capacity, flush_interval)
+                   for path in paths for rate in rates]
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "process": process,
+        "capacity": capacity,
+        "flush_interval": flush_interval,
+        "results": results,
+    }
+
+
+def format_results(results):
+    lines = ["{0:<9} {1:>6} {2:>10} {3:>8} {4:>9} {5:>12} {6:>12} {7:>12} {8:>12}".format(
+        "path", "rate", "achieved", "dropped", "reordered", "cb p50 ns", "cb p99 ns", "skew p50 ns", "skew p99 ns")]
+    for r in results["results"]:
+        lines.append("{0:<9} {1:>6} {2:>10.0f} {3:>8} {4:>9} {5:>12} {6:>12} {7:>12} {8:>12}".format(
+            r["path"], r["rate"] or "max", r["achieved_rate"], r["dropped"], r["reordered"],
+            r["callback_p50_ns"], r["callback_p99_ns"], r["skew_p50_ns"], r["skew_p99_ns"]))
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measures recorder callback latency and event loss under synthetic input")
+    parser.add_argument("--paths", nargs="+", default=default_paths, choices=default_paths)
+    parser.add_argument("--rates", nargs="+", type=int, default=default_rates, help="events per second, 0 for unthrottled")
+    parser.add_argument("--count", type=int, default=5000, help="events per path and rate")
+    parser.add_argument("--process", action="store_true", help="also post-process events in the writer thread")
+    parser.add_argument("--capacity", type=int, default=65536, help="ring buffer capacity")
+    parser.add_argument("--flush-interval", type=float, default=0.05)
+    parser.add_argument("--output", help="save results as JSON")
+    args = parser.parse_args()
+
+    benchmark_results = run_benchmarks(args.paths, args.rates, args.count, args.process, args.capacity, args.flush_interval)
+    print("\n".join(format_results(benchmark_results)))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(benchmark_results, f, indent=2)
@@ -0,0 +1,366 @@
+import ctypes
+import ctypes.util
+import threading
+import log_format
+
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+Z_PIXMAP = 2
+ALL_PLANES = 0xFFFFFFFFFFFFFFFF if ctypes.sizeof(ctypes.c_ulong) == 8 else 0xFFFFFFFF
+
+
+class XImageFuncs(ctypes.Structure):
+    _fields_ = [(name, ctypes.c_void_p) for name in
+                ("create_image", "destroy_image", "get_pixel", "put_pixel", "sub_image", "add_pixel")]
+
+
+class XImage(ctypes.Structure):
+    _fields_ = [
+        ("width", ctypes.c_int),
+        ("height", ctypes.c_int),
+        ("xoffset", ctypes.c_int),
+        ("format", ctypes.c_int),
+        ("data", ctypes.c_void_p),
+        ("byte_order", ctypes.c_int),
+        ("bitmap_unit", ctypes.c_int),
+        ("bitmap_bit_order", ctypes.c_int),
+        ("bitmap_pad", ctypes.c_int),
+        ("depth", ctypes.c_int),
+        ("bytes_per_line", ctypes.c_int),
+        ("bits_per_pixel", ctypes.c_int),
+        ("red_mask", ctypes.c_ulong),
+        ("green_mask", ctypes.c_ulong),
+        ("blue_mask", ctypes.c_ulong),
+        ("obdata", ctypes.c_void_p),
+        ("f", XImageFuncs),
+    ]
+
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [
+        ("shmseg", ctypes.c_ulong),
+        ("shmid", ctypes.c_int),
+        ("shmaddr", ctypes.c_void_p),
+        ("readOnly", ctypes.c_int),
+    ]
+
+
+class XErrorEvent(ctypes.Structure):
+    _fields_ = [
+        ("type", ctypes.c_int),
+        ("display", ctypes.c_void_p),
+        ("resourceid", ctypes.c_ulong),
+        ("serial", ctypes.c_ulong),
+        ("error_code", ctypes.c_ubyte),
+        ("request_code", ctypes.c_ubyte),
+        ("minor_code", ctypes.c_ubyte),
+    ]
+
+
+destroy_image_type = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.POINTER(XImage))
+error_handler_type = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(XErrorEvent))
+
+# X errors reported for each open capture display, collected by handle_x_error() and raised by the capture
+x_errors = {}
+error_handler = None
+error_handler_lock = threading.Lock()
+
+
+def handle_x_error(display, event):
+    """
+    Records an X error instead of letting Xlib's default handler print it and exit the process\n
+    Errors on displays not opened by a capture are ignored
+    """
+    errors = x_errors.get(display)
+    if errors is not None:
+        error = event.contents
+        errors.append((error.error_code, error.request_code, error.minor_code))
+    return 0
+
+
+def install_error_handler(xlib):
+    """Installs handle_x_error() as the process-wide Xlib error handler, once"""
+    global error_handler
+    with error_handler_lock:
+        if error_handler is None:
+            xlib.XSetErrorHandler.argtypes = [error_handler_type]
+            xlib.XSetErrorHandler.restype = ctypes.c_void_p
+            error_handler = error_handler_type(handle_x_error)
+            xlib.XSetErrorHandler(error_handler)
+
+
+def check_region(region, screen_width, screen_height):
+    """Raises ValueError unless region (x, y, width, height) is non-empty and within the screen"""
+    x, y, width, height = region
+    if width <= 0 or height <= 0 or x < 0 or y < 0 or x + width > screen_width or y + height > screen_height:
+        raise ValueError("Region {0} is not within the {1}x{2} screen".format(tuple(region), screen_width, screen_height))
+
+
+class Frame:
+    __slots__ = ("sequence", "timestamp_ns", "data", "width", "height", "stride")
+
+    def __init__(self, sequence, timestamp_ns, data, width, height, stride):
+        """
+        A captured frame of 32-bit BGRX pixels, stride bytes per row\n
+        data is a zero-copy memoryview of the capture buffer, valid until the buffer is reused
+        """
+        self.sequence = sequence
+        self.timestamp_ns = timestamp_ns
+        self.data = data
+        self.width = width
+        self.height = height
+        self.stride = stride
+
+    def to_array(self):
+        """Returns a zero-copy (height, width, 4) NumPy view of the frame; requires numpy"""
+        import numpy
+        rows = numpy.frombuffer(self.data, dtype=numpy.uint8).reshape(self.height, self.stride // 4, 4)
+        return rows[:, :self.width]
+
+    def __repr__(self):
+        return "Frame({0}, {1}, {2}x{3})".format(self.sequence, self.timestamp_ns, self.width, self.height)
+
+
+class XShmCapture:
+    def __init__(self, region=None, buffer_count=4, display_name=None):
+        """
+        Grabs the screen, or region (x, y, width, height), through the X11 MIT-SHM extension\n
+        Frames are captured straight into buffer_count preallocated shared memory images that are reused as a ring;
+        a frame stays valid until buffer_count more frames have been grabbed, which is_valid() checks\n
+        Requires libX11 and libXext
+        """
+        xlib_path = ctypes.util.find_library("X11")
+        xext_path = ctypes.util.find_library("Xext")
+        if not xlib_path or not xext_path:
+            raise OSError("Screen capture requires libX11 and libXext")
+        self.xlib = ctypes.cdll.LoadLibrary(xlib_path)
+        self.xext = ctypes.cdll.LoadLibrary(xext_path)
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._set_prototypes()
+        install_error_handler(self.xlib)
+        self.images = []
+        self.segments = []
+        self.buffers = []
+        self.display = self.xlib.XOpenDisplay(display_name.encode("utf-8") if display_name else None)
+        if not self.display:
+            raise OSError("Cannot open X display {0}".format(display_name or ""))
+        x_errors[self.display] = []
+        if not self.xext.XShmQueryExtension(self.display):
+            self.close()
+            raise OSError("The X server does not support the MIT-SHM extension")
+        screen = self.xlib.XDefaultScreen(self.display)
+        self.root = self.xlib.XRootWindow(self.display, screen)
+        self.screen_width = self.xlib.XDisplayWidth(self.display, screen)
+        self.screen_height = self.xlib.XDisplayHeight(self.display, screen)
+        if region is None:
+            region = (0, 0, self.screen_width, self.screen_height)
+        try:
+            check_region(region, self.screen_width, self.screen_height)
+        except ValueError:
+            self.close()
+            raise
+        self.x, self.y, self.width, self.height = region
+        self.sequence = 0
+        self.buffer_sequences = [-1] * buffer_count
+        try:
+            for _ in range(buffer_count):
+                self._add_buffer(self.xlib.XDefaultVisual(self.display, screen), self.xlib.XDefaultDepth(self.display, screen))
+        except OSError:
+            self.close()
+            raise
+        self.stride = self.images[0].contents.bytes_per_line
+
+    def grab(self, region=None):
+        """
+        Captures the next frame into the ring and returns it\n
+        region (x, y, width, height) grabs that part of the screen instead of the capture's region;
+        it can be anywhere on the screen but no wider or taller than the capture's region
+        """
+        index = self.sequence % len(self.images)
+        image = self.images[index]
+        if region is None:
+            x, y, width, height = self.x, self.y, self.width, self.height
+            stride = self.stride
+            data = self.buffers[index]
+        else:
+            check_region(region, self.screen_width, self.screen_height)
+            x, y, width, height = region
+            if width > self.width or height > self.height:
+                raise ValueError("Region {0} is larger than the capture's {1}x{2}".format(tuple(region), self.width,
+                                                                                          self.height))
+            # the server packs the rows of a smaller grab at its own width
+            stride = width * 4
+            data = self.buffers[index][:stride * height]
+            image.contents.width, image.contents.height, image.contents.bytes_per_line = width, height, stride
+        try:
+            if (not self.xext.XShmGetImage(self.display, self.root, image, x, y, ALL_PLANES)
+                    or x_errors[self.display]):
+                self._check_errors("XShmGetImage")
+                raise OSError("XShmGetImage failed")
+        finally:
+            if region is not None:
+                image.contents.width, image.contents.height, image.contents.bytes_per_line = (self.width, self.height,
+                                                                                              self.stride)
+        timestamp_ns = log_format.clock_ns()
+        frame = Frame(self.sequence, timestamp_ns, data, width, height, stride)
+        self.buffer_sequences[index] = self.sequence
+        self.sequence += 1
+        return frame
+
+    def is_valid(self, frame):
+        """Returns True if the frame's buffer has not been reused yet"""
+        return self.buffer_sequences[frame.sequence % len(self.images)] == frame.sequence
+
+    def close(self):
+        for image, segment in zip(self.images, self.segments):
+            self.xext.XShmDetach(self.display, ctypes.byref(segment))
+            destroy_image_type(image.contents.f.destroy_image)(image)
+            self.libc.shmdt(segment.shmaddr)
+        self.images = []
+        self.segments = []
+        self.buffers = []
+        if self.display:
+            self.xlib.XCloseDisplay(self.display)
+            x_errors.pop(self.display, None)
+            self.display = None
+
+    def _check_errors(self, action):
+        """Raises OSError for the first X error reported since the last check, if any"""
+        errors = x_errors[self.display]
+        if errors:
+            error_code, request_code, minor_code = errors[0]
+            errors.clear()
+            text = ctypes.create_string_buffer(256)
+            self.xlib.XGetErrorText(self.display, error_code, text, len(text))
+            raise OSError("{0} failed: {1} (request {2}.{3})".format(
+                action, text.value.decode("utf-8", "replace"), request_code, minor_code))
+
+    def _add_buffer(self, visual, depth):
+        segment = XShmSegmentInfo()
+        image = self.xext.XShmCreateImage(self.display, visual, depth, Z_PIXMAP, None, ctypes.byref(segment),
+                                          self.width, self.height)
+        if not image:
+            raise OSError("XShmCreateImage failed")
+        if image.contents.bits_per_pixel != 32:
+            destroy_image_type(image.contents.f.destroy_image)(image)
+            raise OSError("Only 32 bits per pixel screens are supported")
+        size = image.contents.bytes_per_line * image.contents.height
+        segment.shmid = self.libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if segment.shmid < 0:
+            destroy_image_type(image.contents.f.destroy_image)(image)
+            raise OSError(ctypes.get_errno(), "shmget failed")
+        segment.shmaddr = self.libc.shmat(segment.shmid, None, 0)
+        # the segment is freed once the last process detaches from it
+        self.libc.shmctl(segment.shmid, IPC_RMID, None)
+        if segment.shmaddr in (None, ctypes.c_void_p(-1).value):
+            destroy_image_type(image.contents.f.destroy_image)(image)
+            raise OSError(ctypes.get_errno(), "shmat failed")
+        segment.readOnly = False
+        image.contents.data = segment.shmaddr
+        attached = self.xext.XShmAttach(self.display, ctypes.byref(segment))
+        self.xlib.XSync(self.display, False)
+        try:
+            if not attached:
+                raise OSError("XShmAttach failed")
+            # the server reports failing to attach (e.g. on a remote display) as an X error
+            self._check_errors("XShmAttach")
+        except OSError:
+            destroy_image_type(image.contents.f.destroy_image)(image)
+            self.libc.shmdt(segment.shmaddr)
+            raise
+        self.images.append(image)
+        self.segments.append(segment)
+        self.buffers.append(memoryview((ctypes.c_ubyte * size).from_address(segment.shmaddr)).cast("B"))
+
+    def _set_prototypes(self):
+        xlib, xext, libc = self.xlib, self.xext, self.libc
+        xlib.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        xlib.XOpenDisplay.restype = ctypes.c_void_p
+        xlib.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        xlib.XDefaultScreen.argtypes = [ctypes.c_void_p]
+        xlib.XRootWindow.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XRootWindow.restype = ctypes.c_ulong
+        xlib.XDefaultVisual.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDefaultVisual.restype = ctypes.c_void_p
+        xlib.XDefaultDepth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayWidth.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XDisplayHeight.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        xlib.XGetErrorText.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        xext.XShmQueryExtension.argtypes = [ctypes.c_void_p]
+        xext.XShmCreateImage.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_void_p,
+                                         ctypes.POINTER(XShmSegmentInfo), ctypes.c_uint, ctypes.c_uint]
+        xext.XShmCreateImage.restype = ctypes.POINTER(XImage)
+        xext.XShmAttach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmDetach.argtypes = [ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo)]
+        xext.XShmGetImage.argtypes = [ctypes.c_void_p, ctypes.c_ulong, ctypes.POINTER(XImage), ctypes.c_int, ctypes.c_int,
+                                      ctypes.c_ulong]
+        libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+        libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+        libc.shmat.restype = ctypes.c_void_p
+        libc.shmdt.argtypes = [ctypes.c_void_p]
+        libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+
+
+class ScreenRecorder:
+    def __init__(self, capture, fps=30, on_frame=None, on_error=None):
+        """
+        Grabs frames from an XShmCapture at a fixed rate in a separate thread\n
+        Frames are due on absolute deadlines, so capture cost does not accumulate into drift;
+        a frame whose deadline has already passed when the previous grab returns is skipped and counted as missed\n
+        on_frame(frame) is called from the capture thread; the latest frame is also kept in latest\n
+        If grabbing or on_frame raises, capturing stops, the exception is kept in error and on_error(error) is called
+        """
+        self.capture = capture
+        self.fps = fps
+        self.on_frame = on_frame
+        self.latest = None
+        self.frames_captured = 0
+        self.frames_missed = 0
+        self.error = None
+        self.on_error = on_error
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def get_report(self):
+        return {
+            "fps": self.fps,
+            "frames_captured": self.frames_captured,
+            "frames_missed": self.frames_missed,
+        }
+
+    def _run(self):
+        try:
+            self._capture_frames()
+        except Exception as error:
+            self.error = error
+            if self.on_error:
+                self.on_error(error)
+
+    def _capture_frames(self):
+        interval_ns = int(1e9 / self.fps)
+        start_ns = log_format.clock_ns()
+        frame_num = 0
+        while True:
+            remaining = start_ns + frame_num * interval_ns - log_format.clock_ns()
+            if remaining > 0 and self.stop_event.wait(remaining / 1e9):
+                break
+            if self.stop_event.is_set():
+                break
+            frame = self.capture.grab()
+            self.latest = frame
+            self.frames_captured += 1
+            if self.on_frame:
+                self.on_frame(frame)
+            # skip deadlines that passed while grabbing
+            next_frame_num = (log_format.clock_ns() - start_ns) // interval_ns + 1
+            self.frames_missed += max(0, next_frame_num - frame_num - 1)
+            frame_num = max(frame_num + 1, next_frame_num)
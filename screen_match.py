@@ -0,0 +1,384 @@
+import os.path
+import zlib
+from functools import partial
+import screen_capture
+
+# luminance weights for BGRX pixels, matching the "L" mode templates are loaded in
+bgr_weights = (0.114, 0.587, 0.299)
+# condition targets start with one of these and a colon; any other target is a template
+condition_kinds = ("pixel", "checksum")
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("Image-anchored waits require numpy") from e
+    return numpy
+
+
+def parse_wait_target(target):
+    """
+    Splits the target of a "w" wait event into (template, region)\n
+    e.g. "button.png" -> ("button.png", None), "button.png@0,0,800,600" -> ("button.png", (0, 0, 800, 600))
+    """
+    template, _, region = target.partition("@")
+    if not template:
+        raise ValueError("Missing template: " + target)
+    if not region:
+        return template, None
+    region = tuple(int(value) for value in region.split(","))
+    if len(region) != 4 or region[2] <= 0 or region[3] <= 0:
+        raise ValueError("Region must be x,y,width,height: " + target)
+    return template, region
+
+
+def split_condition_target(target):
+    """Returns ("pixel" | "checksum" | "template", the rest of the target)"""
+    kind, separator, spec = target.partition(":")
+    if separator and kind in condition_kinds:
+        return kind, spec
+    return "template", target
+
+
+def parse_pixel_target(spec):
+    """
+    Parses the spec of a pixel condition into ([(x, y, (r, g, b)), ...], tolerance)\n
+    e.g. "10,20=00ff00;12,20=00ff00~8" -> ([(10, 20, (0, 255, 0)), (12, 20, (0, 255, 0))], 8)
+    """
+    spec, _, tolerance = spec.partition("~")
+    pixels = []
+    for entry in spec.split(";"):
+        try:
+            xy, _, color = entry.partition("=")
+            x, y = (int(value) for value in xy.split(","))
+            if len(color) != 6:
+                raise ValueError
+            pixels.append((x, y, tuple(bytes.fromhex(color))))
+        except ValueError:
+            raise ValueError("Pixels must be x,y=rrggbb: " + entry) from None
+    return pixels, int(tolerance) if tolerance else 0
+
+
+def format_pixel_target(pixels, tolerance=0):
+    spec = ";".join("{0},{1}={2:02x}{3:02x}{4:02x}".format(x, y, *color) for x, y, color in pixels)
+    if tolerance:
+        spec += "~{0}".format(tolerance)
+    return "pixel:" + spec
+
+
+def parse_checksum_target(spec):
+    """Parses the spec of a checksum condition, e.g. "0,0,64,32=1a2b3c4d", into (region, checksum)"""
+    region, _, checksum = spec.partition("=")
+    region = tuple(int(value) for value in region.split(","))
+    if len(region) != 4 or region[2] <= 0 or region[3] <= 0 or not checksum:
+        raise ValueError("Checksums must be x,y,width,height=crc32: " + spec)
+    return region, int(checksum, 16)
+
+
+def format_checksum_target(region, checksum):
+    return "checksum:{0},{1},{2},{3}={4:08x}".format(*region, checksum)
+
+
+def get_bounding_region(points):
+    """Returns the smallest (x, y, width, height) region containing every (x, y, ...) point"""
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return min(xs), min(ys), max(xs) - min(xs) + 1, max(ys) - min(ys) + 1
+
+
+def group_points(points, max_size=64):
+    """
+    Splits (x, y, ...) points into groups whose bounding regions are at most max_size pixels wide and high,
+    so that distant points are grabbed separately instead of through everything between them\n
+    Returns [(region, [(x, y, ...) relative to region, ...]), ...]
+    """
+    groups = []
+    for point in points:
+        for group in groups:
+            region = get_bounding_region(group + [point])
+            if region[2] <= max_size and region[3] <= max_size:
+                group.append(point)
+                break
+        else:
+            groups.append([point])
+    pixel_groups = []
+    for group in groups:
+        region = get_bounding_region(group)
+        pixel_groups.append((region, [(point[0] - region[0], point[1] - region[1]) + tuple(point[2:]) for point in group]))
+    return pixel_groups
+
+
+def format_wait_target(template, region=None):
+    if " " in template or "@" in template:
+        raise ValueError("Template names cannot contain spaces or @: " + template)
+    if region is None:
+        return template
+    return "{0}@{1},{2},{3},{4}".format(template, *region)
+
+
+def load_template(file_name):
+    """Loads an image as a grayscale float array; requires Pillow"""
+    from PIL import Image
+    numpy = import_numpy()
+    with Image.open(file_name) as image:
+        return numpy.asarray(image.convert("L"), dtype=numpy.float64)
+
+
+def downsample(image):
+    """Halves an image by averaging 2x2 blocks"""
+    height, width = image.shape[0] // 2, image.shape[1] // 2
+    return image[:height * 2, :width * 2].reshape(height, 2, width, 2).mean(axis=(1, 3))
+
+
+def window_sums(image, height, width):
+    """Returns the sum of every height x width window of an image, from its integral image"""
+    numpy = import_numpy()
+    integral = numpy.zeros((image.shape[0] + 1, image.shape[1] + 1))
+    integral[1:, 1:] = image.cumsum(axis=0).cumsum(axis=1)
+    return integral[height:, width:] - integral[:-height, width:] - integral[height:, :-width] + integral[:-height, :-width]
+
+
+def match_scores(image, template):
+    """
+    Returns the normalized cross-correlation of template with every position in image, between -1 and 1\n
+    The correlation is computed with FFTs and the window statistics with integral images,
+    so the cost does not grow with the template size
+    """
+    numpy = import_numpy()
+    height, width = template.shape
+    if image.shape[0] < height or image.shape[1] < width:
+        return numpy.zeros((0, 0))
+    centered = template - template.mean()
+    template_norm = numpy.sqrt((centered * centered).sum())
+    shape = image.shape
+    # correlating with the template is convolving with it flipped; the valid positions do not wrap around
+    cross = numpy.fft.irfft2(numpy.fft.rfft2(image) * numpy.fft.rfft2(centered[::-1, ::-1], shape), shape)
+    cross = cross[height - 1:, width - 1:]
+    sums = window_sums(image, height, width)
+    variances = window_sums(image * image, height, width) - sums * sums / (height * width)
+    norms = numpy.sqrt(numpy.maximum(variances, 0.0)) * template_norm
+    scores = numpy.zeros_like(cross)
+    numpy.divide(cross, norms, out=scores, where=norms > 1e-6)
+    return scores
+
+
+class TemplateMatcher:
+    def __init__(self, template, threshold=0.9, min_size=8, max_levels=4, candidates=5, search_radius=2):
+        """
+        Finds a grayscale template in grayscale images by normalized cross-correlation\n
+        Only the coarsest level of an image pyramid is searched in full; the best candidates there are refined
+        level by level within search_radius pixels, so most of the image is only ever looked at at low resolution\n
+        The last match is checked first, so a template that has not moved is found with a single comparison
+        """
+        numpy = import_numpy()
+        template = numpy.asarray(template, dtype=numpy.float64)
+        if template.std() == 0:
+            raise ValueError("A template must not be a single color")
+        self.threshold = threshold
+        self.candidates = candidates
+        self.search_radius = search_radius
+        self.templates = [template]
+        while len(self.templates) < max_levels and min(self.templates[-1].shape) >= 2 * min_size:
+            self.templates.append(downsample(self.templates[-1]))
+        self.last_match = None
+
+    def find(self, image):
+        """Returns (x, y, score) for the top left corner of the best match in image, or None if it scores below threshold"""
+        numpy = import_numpy()
+        height, width = self.templates[0].shape
+        if self.last_match:
+            x, y = self.last_match
+            if y + height <= image.shape[0] and x + width <= image.shape[1]:
+                score = match_scores(image[y:y + height, x:x + width], self.templates[0])[0, 0]
+                if score >= self.threshold:
+                    return x, y, float(score)
+        pyramid = [image]
+        for _ in range(len(self.templates) - 1):
+            pyramid.append(downsample(pyramid[-1]))
+        scores = match_scores(pyramid[-1], self.templates[-1])
+        if not scores.size:
+            return None
+        count = min(self.candidates, scores.size)
+        best = numpy.argpartition(scores.ravel(), -count)[-count:]
+        candidates = [(int(i) // scores.shape[1], int(i) % scores.shape[1], scores.flat[i]) for i in best]
+        for level in range(len(self.templates) - 2, -1, -1):
+            candidates = [self._refine(pyramid[level], self.templates[level], 2 * y, 2 * x) for y, x, _ in candidates]
+        y, x, score = max(candidates, key=lambda candidate: candidate[2])
+        if score < self.threshold:
+            return None
+        self.last_match = x, y
+        return x, y, float(score)
+
+    def _refine(self, image, template, y, x):
+        """Returns (y, x, score) of the best match within search_radius of (y, x)"""
+        numpy = import_numpy()
+        height, width = template.shape
+        radius = self.search_radius
+        top = max(0, min(y - radius, image.shape[0] - height))
+        left = max(0, min(x - radius, image.shape[1] - width))
+        scores = match_scores(image[top:y + radius + height, left:x + radius + width], template)
+        best_y, best_x = numpy.unravel_index(numpy.argmax(scores), scores.shape)
+        return top + int(best_y), left + int(best_x), scores[best_y, best_x]
+
+
+class ScreenWaits:
+    def __init__(self, template_dir, threshold=0.9, display_name=None):
+        """
+        Evaluates the wait and check events of a log against the screen, with templates loaded from template_dir\n
+        Regions are grabbed through screen_capture.XShmCapture, or with pyautogui screenshots if MIT-SHM is unavailable\n
+        Templates and matchers are loaded on first use and kept, so repeated waits reuse their last match\n
+        Every region is grabbed through one display connection and shared memory image,
+        sized to the largest region grabbed so far\n
+        Pixel conditions only grab small boxes around their pixels and checksum conditions only their region,
+        and both read the shared memory buffer in place, so they take well under a millisecond
+        """
+        self.template_dir = template_dir
+        self.threshold = threshold
+        self.display_name = display_name
+        self.matchers = {}
+        self.capture = None
+        self.use_xshm = True
+
+    def get_condition(self, target):
+        """
+        Returns a function that checks whether a wait or check event target is satisfied, which is one of\n
+        "template.png[@x,y,width,height]": the template is visible on the screen or in the region\n
+        "pixel:x,y=rrggbb;...[~tolerance]": every pixel has its color, each channel within tolerance\n
+        "checksum:x,y,width,height=crc32": the region's pixels have that checksum (see region_checksum())
+        """
+        kind, spec = split_condition_target(target)
+        if kind == "pixel":
+            pixels, tolerance = parse_pixel_target(spec)
+            return partial(self.pixels_match, group_points(pixels), tolerance)
+        if kind == "checksum":
+            region, checksum = parse_checksum_target(spec)
+            return partial(self.checksum_matches, region, checksum)
+        template, region = parse_wait_target(target)
+        return partial(self.is_visible, template, region)
+
+    def find(self, template, region=None):
+        """Returns (x, y, score) of the template's top left corner on the screen, or None if it is not visible"""
+        # the last match is relative to the region, so each region gets its own matcher
+        matcher = self.matchers.get((template, region))
+        if matcher is None:
+            template_image = load_template(os.path.join(self.template_dir, template))
+            matcher = self.matchers[(template, region)] = TemplateMatcher(template_image, self.threshold)
+        image, left, top = self.grab(region)
+        match = matcher.find(image)
+        if match is None:
+            return None
+        x, y, score = match
+        return left + x, top + y, score
+
+    def is_visible(self, template, region=None):
+        return self.find(template, region) is not None
+
+    def pixels_match(self, pixel_groups, tolerance=0):
+        """pixel_groups are [(region, [(x, y, (r, g, b)) relative to region, ...]), ...] from group_points()"""
+        for region, pixels in pixel_groups:
+            for (x, y, expected), color in zip(pixels, self.read_pixels(region, pixels)):
+                if (abs(color[0] - expected[0]) > tolerance or abs(color[1] - expected[1]) > tolerance or
+                        abs(color[2] - expected[2]) > tolerance):
+                    return False
+        return True
+
+    def read_pixels(self, region, points):
+        """Returns the (r, g, b) colors of (x, y, ...) points relative to region"""
+        capture = self.get_capture(region)
+        if capture is None:
+            import pyautogui
+            return [tuple(pyautogui.pixel(region[0] + point[0], region[1] + point[1])) for point in points]
+        frame = capture.grab(region)
+        data = frame.data
+        colors = []
+        for point in points:
+            offset = point[1] * frame.stride + point[0] * 4
+            colors.append((data[offset + 2], data[offset + 1], data[offset]))
+        return colors
+
+    def checksum_matches(self, region, checksum):
+        return self.region_checksum(region) == checksum
+
+    def region_checksum(self, region):
+        """Returns the CRC-32 of the blue, green and red planes of region, the same with or without MIT-SHM"""
+        capture = self.get_capture(region)
+        if capture is None:
+            import pyautogui
+            data = pyautogui.screenshot(region=region).convert("RGB").tobytes()
+            planes = data[2::3], data[1::3], data[0::3]
+        else:
+            data = capture.grab(region).data.tobytes()
+            planes = data[0::4], data[1::4], data[2::4]
+        checksum = 0
+        for plane in planes:
+            checksum = zlib.crc32(plane, checksum)
+        return checksum
+
+    def sample_pixel_target(self, points, tolerance=0):
+        """Returns a pixel condition target for the current colors of (x, y) screen points"""
+        colors = {}
+        for region, group in group_points(points):
+            for (x, y), color in zip(group, self.read_pixels(region, group)):
+                colors[region[0] + x, region[1] + y] = color
+        return format_pixel_target([(x, y, colors[x, y]) for x, y in points], tolerance)
+
+    def sample_checksum_target(self, region):
+        """Returns a checksum condition target for the current contents of region"""
+        return format_checksum_target(region, self.region_checksum(region))
+
+    def get_capture(self, region=None):
+        """
+        Returns the shared capture, grown if needed so that it can grab region (or the whole screen),
+        or None if MIT-SHM is unavailable
+        """
+        if not self.use_xshm:
+            return None
+        capture = self.capture
+        size = region[2:] if region else None
+        if capture is not None:
+            width, height = size or (capture.screen_width, capture.screen_height)
+            if width <= capture.width and height <= capture.height:
+                return capture
+            size = max(width, capture.width), max(height, capture.height)
+            capture.close()
+            self.capture = None
+        try:
+            # the capture's own region is only used for its size; grab() is always given a region
+            self.capture = screen_capture.XShmCapture((0, 0, *size) if size else None, 1, self.display_name)
+        except OSError:
+            self.use_xshm = False
+        return self.capture
+
+    def grab(self, region=None):
+        """Returns (grayscale image, x, y) for region (x, y, width, height) of the screen, or the whole screen"""
+        numpy = import_numpy()
+        capture = self.get_capture(region)
+        left, top = region[:2] if region else (0, 0)
+        if capture is not None:
+            frame = capture.grab(region or (0, 0, capture.screen_width, capture.screen_height))
+            return frame.to_array()[..., :3] @ numpy.array(bgr_weights), left, top
+        import pyautogui
+        image = pyautogui.screenshot(region=region)
+        return numpy.asarray(image.convert("L"), dtype=numpy.float64), left, top
+
+    def close(self):
+        if self.capture is not None:
+            self.capture.close()
+            self.capture = None
+
+
+def capture_template(file_name, region, display_name=None):
+    """Saves region (x, y, width, height) of the screen as a template image; requires Pillow"""
+    from PIL import Image
+    try:
+        capture = screen_capture.XShmCapture(region, 1, display_name)
+    except OSError:
+        import pyautogui
+        pyautogui.screenshot(region=region).save(file_name)
+        return
+    try:
+        # BGRX to RGB
+        Image.fromarray(capture.grab().to_array()[..., 2::-1].copy()).save(file_name)
+    finally:
+        capture.close()
@@ -0,0 +1,257 @@
+import bisect
+import struct
+import zlib
+
+video_extension = ".svid"
+frame_index_extension = ".sidx"
+# the files that belong to a log recorded with its screen
+extensions = (video_extension, frame_index_extension)
+
+VIDEO_MAGIC = b"SCTV"
+VIDEO_VERSION = 1
+FLAG_KEYFRAME = 0x01
+INDEX_MAGIC = b"SCTI"
+INDEX_VERSION = 1
+
+# magic, version, width, height, tile size, keyframe interval
+video_header_struct = struct.Struct("<4sHIIHI")
+# timestamp nanoseconds, frame flags, changed tile count, compressed payload length
+frame_header_struct = struct.Struct("<qBII")
+# frame number, timestamp nanoseconds, file offset of the keyframe
+index_entry_struct = struct.Struct("<IqQ")
+# index offset, frame count, keyframe count, magic
+footer_struct = struct.Struct("<QII4s")
+# magic, version, frame count, event count, followed by the frame times and then the event entries
+frame_index_header_struct = struct.Struct("<4sHII")
+frame_time_struct = struct.Struct("<q")
+# nearest frame number, event time minus frame time in nanoseconds
+event_frame_struct = struct.Struct("<Iq")
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("Screen video encoding and decoding require numpy") from e
+    return numpy
+
+
+class VideoWriter:
+    def __init__(self, file_name, width, height, tile_size=32, keyframe_interval=300, compression_level=1):
+        """
+        Encodes 32-bit frames as a keyframe followed by the tiles that changed since the previous frame\n
+        Frames are compared tile_size square tiles at a time; only changed tiles are compressed and written,
+        and a full keyframe is written every keyframe_interval frames so that the video can be seeked\n
+        Use write() for each frame and close() when finished, which appends the keyframe index\n
+        The timestamp of every written frame is kept in frame_times
+        """
+        self.numpy = import_numpy()
+        self.file = open(file_name, "wb")
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.compression_level = compression_level
+        self.tile_rows = -(-height // tile_size)
+        self.tile_columns = -(-width // tile_size)
+        shape = (self.tile_rows * tile_size, self.tile_columns * tile_size, 4)
+        # the current and previous frames are swapped after every write, so no frame buffers are allocated per frame
+        self.current = self.numpy.zeros(shape, dtype=self.numpy.uint8)
+        self.previous = self.numpy.zeros(shape, dtype=self.numpy.uint8)
+        self.frame_count = 0
+        self.frame_times = []
+        self.keyframes = []
+        self.bytes_written = 0
+        self.tiles_written = 0
+        self.file.write(video_header_struct.pack(VIDEO_MAGIC, VIDEO_VERSION, width, height, tile_size, keyframe_interval))
+
+    def write(self, frame, timestamp_ns=None):
+        """frame is a screen_capture.Frame or a (height, width, 4) uint8 array"""
+        if timestamp_ns is None:
+            timestamp_ns = frame.timestamp_ns
+        if hasattr(frame, "to_array"):
+            frame = frame.to_array()
+        numpy = self.numpy
+        self.current[:self.height, :self.width] = frame
+        if self.frame_count % self.keyframe_interval == 0:
+            flags = FLAG_KEYFRAME
+            tile_count = self.tile_rows * self.tile_columns
+            payload = zlib.compress(self.current.data, self.compression_level)
+            self.keyframes.append((self.frame_count, timestamp_ns, self.file.tell()))
+        else:
+            flags = 0
+            ts = self.tile_size
+            # compare whole pixels as 32-bit words, then reduce to one flag per tile
+            changed = (self.current.view(numpy.uint32) != self.previous.view(numpy.uint32)).reshape(
+                self.tile_rows, ts, self.tile_columns, ts).any(axis=(1, 3))
+            rows, columns = numpy.nonzero(changed)
+            tile_count = len(rows)
+            if tile_count:
+                tiles = self.current.reshape(self.tile_rows, ts, self.tile_columns, ts, 4)[rows, :, columns]
+                positions = numpy.stack((rows, columns), axis=1).astype("<u2")
+                payload = zlib.compress(positions.tobytes() + tiles.tobytes(), self.compression_level)
+            else:
+                payload = b""
+        self.file.write(frame_header_struct.pack(timestamp_ns, flags, tile_count, len(payload)))
+        self.file.write(payload)
+        self.bytes_written += frame_header_struct.size + len(payload)
+        self.tiles_written += tile_count
+        self.current, self.previous = self.previous, self.current
+        self.frame_times.append(timestamp_ns)
+        self.frame_count += 1
+
+    def close(self):
+        index_offset = self.file.tell()
+        for entry in self.keyframes:
+            self.file.write(index_entry_struct.pack(*entry))
+        self.file.write(footer_struct.pack(index_offset, self.frame_count, len(self.keyframes), VIDEO_MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class VideoReader:
+    def __init__(self, file_name):
+        """
+        Decodes a screen video one frame at a time into a single reused canvas\n
+        Iterating yields (frame number, timestamp_ns, frame) where frame is a (height, width, 4) view of the canvas,
+        valid until the next frame is decoded; use seek() to jump to a frame via the nearest earlier keyframe\n
+        Videos that were not closed properly can still be read from the start, but not seeked
+        """
+        self.numpy = import_numpy()
+        self.file_name = file_name
+        self.file = open(file_name, "rb")
+        magic, version, self.width, self.height, self.tile_size, self.keyframe_interval = video_header_struct.unpack(
+            self.file.read(video_header_struct.size))
+        if magic != VIDEO_MAGIC:
+            raise ValueError("{0} is not a screen video".format(file_name))
+        if version > VIDEO_VERSION:
+            raise ValueError("Unsupported screen video version: {0}".format(version))
+        self.data_start = self.file.tell()
+        self.tile_rows = -(-self.height // self.tile_size)
+        self.tile_columns = -(-self.width // self.tile_size)
+        self.canvas = self.numpy.zeros((self.tile_rows * self.tile_size, self.tile_columns * self.tile_size, 4),
+                                       dtype=self.numpy.uint8)
+        self.frame_count = None
+        self.keyframes = []
+        self.data_end = None
+        self._read_index()
+        self.frame_number = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.data_end is not None and self.file.tell() >= self.data_end:
+            raise StopIteration
+        header = self.file.read(frame_header_struct.size)
+        if len(header) < frame_header_struct.size:
+            raise StopIteration
+        timestamp_ns, flags, tile_count, payload_length = frame_header_struct.unpack(header)
+        payload = self.file.read(payload_length)
+        if len(payload) < payload_length:
+            raise StopIteration
+        self._apply(flags, tile_count, payload)
+        frame_number = self.frame_number
+        self.frame_number += 1
+        return frame_number, timestamp_ns, self.canvas[:self.height, :self.width]
+
+    def seek(self, frame_number):
+        """Decodes up to frame_number and returns (frame number, timestamp_ns, frame)"""
+        if not self.keyframes:
+            raise ValueError("{0} has no keyframe index".format(self.file_name))
+        if not 0 <= frame_number < self.frame_count:
+            raise IndexError("Frame {0} is out of range".format(frame_number))
+        keyframe = max((entry for entry in self.keyframes if entry[0] <= frame_number), key=lambda entry: entry[0])
+        # continue from the current position if it is between the keyframe and the target
+        if not keyframe[0] < self.frame_number <= frame_number:
+            self.file.seek(keyframe[2])
+            self.frame_number = keyframe[0]
+        while True:
+            result = next(self)
+            if result[0] == frame_number:
+                return result
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _apply(self, flags, tile_count, payload):
+        numpy = self.numpy
+        if flags & FLAG_KEYFRAME:
+            self.canvas[...] = numpy.frombuffer(zlib.decompress(payload), dtype=numpy.uint8).reshape(self.canvas.shape)
+            return
+        if not tile_count:
+            return
+        ts = self.tile_size
+        data = zlib.decompress(payload)
+        positions = numpy.frombuffer(data, dtype="<u2", count=2 * tile_count).reshape(tile_count, 2)
+        tiles = numpy.frombuffer(data, dtype=numpy.uint8, offset=4 * tile_count).reshape(tile_count, ts, ts, 4)
+        self.canvas.reshape(self.tile_rows, ts, self.tile_columns, ts, 4)[positions[:, 0], :, positions[:, 1]] = tiles
+
+    def _read_index(self):
+        self.file.seek(0, 2)
+        end = self.file.tell()
+        if end - self.data_start >= footer_struct.size:
+            self.file.seek(end - footer_struct.size)
+            index_offset, frame_count, keyframe_count, magic = footer_struct.unpack(self.file.read(footer_struct.size))
+            if magic == VIDEO_MAGIC and index_offset + keyframe_count * index_entry_struct.size + footer_struct.size == end:
+                self.file.seek(index_offset)
+                data = self.file.read(keyframe_count * index_entry_struct.size)
+                self.keyframes = list(index_entry_struct.iter_unpack(data))
+                self.frame_count = frame_count
+                self.data_end = index_offset
+        self.file.seek(self.data_start)
+
+
+def get_nearest_frames(frame_times, event_times):
+    """
+    Returns the (frame number, event time - frame time) of the frame nearest to each event\n
+    Both time lists must be sorted and on the same clock
+    """
+    nearest = []
+    if not frame_times:
+        return nearest
+    last = len(frame_times) - 1
+    for event_time in event_times:
+        i = bisect.bisect_left(frame_times, event_time)
+        if i > last or (i > 0 and event_time - frame_times[i - 1] <= frame_times[i] - event_time):
+            i -= 1
+        nearest.append((i, event_time - frame_times[i]))
+    return nearest
+
+
+def write_frame_index(file_name, frame_times, event_times):
+    """
+    Writes the frame times and the nearest frame to each event of a log,
+    so that the screen at event N can be found without decoding the video up to it\n
+    Times are in nanoseconds on the same clock, e.g. since the recording started;
+    without any frames, no events can be mapped and none are written
+    """
+    nearest = get_nearest_frames(frame_times, event_times)
+    with open(file_name, "wb") as f:
+        f.write(frame_index_header_struct.pack(INDEX_MAGIC, INDEX_VERSION, len(frame_times), len(nearest)))
+        f.write(b"".join(frame_time_struct.pack(frame_time) for frame_time in frame_times))
+        f.write(b"".join(event_frame_struct.pack(*entry) for entry in nearest))
+
+
+def read_frame_index(file_name):
+    """Returns (frame times, [(frame number, event time - frame time) for each event]) from a frame index"""
+    with open(file_name, "rb") as f:
+        magic, version, frame_count, event_count = frame_index_header_struct.unpack(f.read(frame_index_header_struct.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError("{0} is not a frame index".format(file_name))
+        if version > INDEX_VERSION:
+            raise ValueError("Unsupported frame index version: {0}".format(version))
+        frame_times = [frame_time for (frame_time,) in frame_time_struct.iter_unpack(f.read(frame_count * frame_time_struct.size))]
+        events = list(event_frame_struct.iter_unpack(f.read(event_count * event_frame_struct.size)))
+    return frame_times, events
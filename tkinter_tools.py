@@ -1,3 +1,4 @@
+import collections
 import tkinter
 from tkinter import ttk
 from typing import Literal
@@ -1092,6 +1093,70 @@ class Text(tkinter.Text):
         self.update()
 
 
+class Console(Text):
+    def __init__(self, parent, text: str = None, max_lines=1000, flush_interval=50,
+                 wrap_on: Literal["none", "char", "word"] = "word",
+                 font=None, text_color=None, background_color=None,
+                 width=None, height=None, take_focus=None, backdrop=None, cursor_shape=None,
+                 grid_column=None, grid_row=None, grid_columnspan=None, grid_rowspan=None, grid_sticky="NSEW",
+                 pack_side=None, pack_anchor=None, pack_fill=None, pack_expand=None,
+                 ipad_x=None, ipad_y=None, pad_x=None, pad_y=None):
+        """
+        Read-only Text widget for log output\n
+        output() only queues a line, so it is cheap to call at a high rate;
+        queued lines are inserted in one batch every flush_interval ms and only the last max_lines lines are kept\n
+        The view follows new output unless it has been scrolled up\n
+        Use either the grid_ or pack_ parameters to make the widget appear,
+        or use the grid_configure or pack_configure functions
+        """
+        self.max_lines = max_lines
+        self.flush_interval = flush_interval
+        self.pending_lines = collections.deque()
+        self.flush_scheduled = False
+
+        # extends functionality from Text
+        super().__init__(parent, text=text, wrap_on=wrap_on, font=font, text_color=text_color,
+                         background_color=background_color, width=width, height=height, state="disabled",
+                         take_focus=take_focus, backdrop=backdrop, cursor_shape=cursor_shape,
+                         grid_column=grid_column, grid_row=grid_row,
+                         grid_columnspan=grid_columnspan, grid_rowspan=grid_rowspan, grid_sticky=grid_sticky,
+                         pack_side=pack_side, pack_anchor=pack_anchor, pack_fill=pack_fill, pack_expand=pack_expand,
+                         ipad_x=ipad_x, ipad_y=ipad_y, pad_x=pad_x, pad_y=pad_y
+                         )
+
+    def output(self, text: str):
+        self.pending_lines.append(text)
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.after(self.flush_interval, self.flush)
+
+    def flush(self):
+        """Inserts all queued lines at once"""
+        self.flush_scheduled = False
+        lines = []
+        while self.pending_lines:
+            lines.append(self.pending_lines.popleft())
+        if not lines:
+            return
+        # lines that would be trimmed straight away are never inserted
+        lines = lines[-self.max_lines:]
+        follow = self.yview()[1] >= 1.0
+        self.configure(state="normal")
+        self.insert("end", "\n".join(lines) + "\n")
+        excess = int(self.index("end-1c").split(".")[0]) - 1 - self.max_lines
+        if excess > 0:
+            self.delete("1.0", "{0}.0".format(excess + 1))
+        self.configure(state="disabled")
+        if follow:
+            self.see("end")
+
+    def clear(self):
+        self.pending_lines.clear()
+        self.configure(state="normal")
+        self.delete("1.0", "end")
+        self.configure(state="disabled")
+
+
 class Frame_with_scrollbar(ttk.Frame):
     def __init__(self, parent,
                  sticky_scrollframe: str = "NSEW", sticky_content: str = "NSEW", width=None, height=None,
@@ -1493,3 +1558,19 @@ class Compacted:
                              ipad_x=ipad_x, ipad_y=ipad_y, pad_x=pad_x, pad_y=pad_y
 
                              )
+
+    class Console(Console):
+        def __init__(self, parent, text=None, max_lines=1000,
+                     grid_column=None, grid_row=None, grid_columnspan=None, grid_rowspan=None, grid_sticky="NSEW",
+                     pack_side=None, pack_anchor=None, pack_fill=None, pack_expand=None,
+                     ipad_x=None, ipad_y=None, pad_x=None, pad_y=None):
+            """
+            Use either the grid_ or pack_ parameters to make the widget appear,
+            or use the grid_configure or pack_configure functions
+            """
+            super().__init__(parent=parent, text=text, max_lines=max_lines,
+                             grid_column=grid_column, grid_row=grid_row,
+                             grid_columnspan=grid_columnspan, grid_rowspan=grid_rowspan, grid_sticky=grid_sticky,
+                             pack_side=pack_side, pack_anchor=pack_anchor, pack_fill=pack_fill, pack_expand=pack_expand,
+                             ipad_x=ipad_x, ipad_y=ipad_y, pad_x=pad_x, pad_y=pad_y
+                             )